@@ -0,0 +1,306 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from data_store import load_weekly_data, load_weekly_index
+from instrument import cache_resource
+
+# --- Breeding-condition thresholds (weekly means / sums) ---
+DEFAULT_THRESHOLDS = {
+    "max_temp": 35,        # TMax <= max_temp
+    "min_temp": 18,        # TMin >= min_temp
+    "min_rh": 60,          # min_rh <= RH <= max_rh
+    "max_rh": 80,
+    "min_rainfall": 0.5,   # min_rainfall <= rain <= max_rainfall
+    "max_rainfall": 150,
+}
+
+# --- Threshold masks: (column, lower-bound key, upper-bound key) ---
+MASK_SPECS = {
+    "max": ("temperature_2m_max", None, "max_temp"),
+    "min": ("temperature_2m_min", "min_temp", None),
+    "hum": ("relative_humidity_2m_mean", "min_rh", "max_rh"),
+    "rainfall": ("rain_sum", "min_rainfall", "max_rainfall"),
+    # Top Blocks temperature band: TMax between the min and max temperature
+    "temp_band": ("temperature_2m_max", "min_temp", "max_temp"),
+}
+# Combined breeding condition: (TMax AND TMin) OR RH
+COMBINED_MASKS = {"all": ("max", "min", "hum")}
+
+# --- Trigger week rule ---
+# >= 50% rise over the previous 2-week mean, with the mean of the next 3 weeks
+# still >= 40% above that same baseline.
+TRIGGER_RISE = 0.5
+TRIGGER_SUSTAIN = 0.4
+TRIGGER_PREV_WEEKS = 2
+TRIGGER_NEXT_WEEKS = 3
+
+LAG_VARIABLES = ["all", "max", "min", "hum", "rainfall"]
+
+
+# --- Block layout ---
+# The weekly frame is sorted by (district, block, week) and the index holds one
+# contiguous slice per block, so a per-row block id is just a repeat.
+def block_bounds(index):
+    keys = list(index["blocks"])
+    starts = np.array([s.start for s in index["blocks"].values()], dtype=np.int64)
+    stops = np.array([s.stop for s in index["blocks"].values()], dtype=np.int64)
+    return keys, starts, stops
+
+
+def block_ids(starts, stops):
+    return np.repeat(np.arange(len(starts)), stops - starts)
+
+
+# --- Grouped window helpers (no per-block loops) ---
+# Value k weeks earlier (k > 0) or later (k < 0) within the same block; NaN
+# where the window crosses a block boundary.
+def grouped_shift(values, groups, k):
+    out = np.full(len(values), np.nan)
+    if k > 0:
+        out[k:] = values[:-k]
+        out[k:][groups[k:] != groups[:-k]] = np.nan
+    elif k < 0:
+        out[:k] = values[-k:]
+        out[:k][groups[:k] != groups[-k:]] = np.nan
+    else:
+        out[:] = values
+    return out
+
+
+# Length of the run of consecutive True values ending at each row, restarting
+# at every block start.
+def run_lengths(mask, starts):
+    positions = np.arange(len(mask))
+    breaks = np.where(mask, -1, positions)
+    breaks[starts[mask[starts]]] = starts[mask[starts]] - 1
+    return positions - np.maximum.accumulate(breaks)
+
+
+# --- Threshold masks ---
+# Only the thresholds a mask depends on go into its cache key, so moving one
+# slider leaves every other variable's cached mask, intervals and lags alone.
+def mask_threshold_keys(name):
+    if name in COMBINED_MASKS:
+        return sorted({k for part in COMBINED_MASKS[name] for k in mask_threshold_keys(part)})
+    _, lo_key, hi_key = MASK_SPECS[name]
+    return [k for k in (lo_key, hi_key) if k is not None]
+
+
+def mask_bounds(name, thresholds):
+    return tuple((k, thresholds[k]) for k in mask_threshold_keys(name))
+
+
+def variable_mask(df, name, thresholds):
+    if name in COMBINED_MASKS:
+        tmax, tmin, rh = (variable_mask(df, part, thresholds) for part in COMBINED_MASKS[name])
+        return (tmax & tmin) | rh
+
+    col, lo_key, hi_key = MASK_SPECS[name]
+    values = df[col].to_numpy(dtype=float)
+    mask = np.ones(len(values), dtype=bool)
+    if lo_key is not None:
+        mask &= values >= thresholds[lo_key]
+    if hi_key is not None:
+        mask &= values <= thresholds[hi_key]
+    return mask
+
+
+def threshold_masks(df, thresholds=DEFAULT_THRESHOLDS):
+    return {name: variable_mask(df, name, thresholds) for name in LAG_VARIABLES}
+
+
+# --- Highlight intervals for every block at once ---
+# A run continues while the next row is in the same block and exactly one week
+# later; each run is expanded by 6 days so it covers its last full week.
+# Returns run start/end dates plus per-block offsets into them.
+def mask_intervals(mask, groups, weeks, n_blocks):
+    same_run = (groups[1:] == groups[:-1]) & (np.diff(weeks) == np.timedelta64(7, 'D'))
+    continues_prev = np.r_[False, mask[:-1] & same_run]
+    continues_next = np.r_[mask[1:] & same_run, False]
+
+    run_starts = np.flatnonzero(mask & ~continues_prev)
+    run_ends = np.flatnonzero(mask & ~continues_next)
+    return {
+        "starts": pd.to_datetime(weeks[run_starts]),
+        "ends": pd.to_datetime(weeks[run_ends]) + pd.Timedelta(days=6),
+        "offsets": np.searchsorted(groups[run_starts], np.arange(n_blocks + 1)),
+    }
+
+
+def block_intervals(intervals, position):
+    lo, hi = intervals["offsets"][position], intervals["offsets"][position + 1]
+    return list(zip(intervals["starts"][lo:hi], intervals["ends"][lo:hi]))
+
+
+# --- Trigger rows: first qualifying week per block (-1 if none) ---
+def trigger_rows(cases, groups, n_blocks):
+    prev_mean = sum(grouped_shift(cases, groups, k) for k in range(1, TRIGGER_PREV_WEEKS + 1)) / TRIGGER_PREV_WEEKS
+    next_mean = sum(grouped_shift(cases, groups, -k) for k in range(1, TRIGGER_NEXT_WEEKS + 1)) / TRIGGER_NEXT_WEEKS
+
+    is_trigger = (
+        (cases > 0)
+        & (cases >= (1 + TRIGGER_RISE) * prev_mean)
+        & (next_mean >= (1 + TRIGGER_SUSTAIN) * prev_mean)
+    )
+    rows = np.flatnonzero(is_trigger)
+    blocks, first = np.unique(groups[rows], return_index=True)
+
+    out = np.full(n_blocks, -1, dtype=np.int64)
+    out[blocks] = rows[first]
+    return out
+
+
+# --- Lag: weeks the threshold was met continuously right before the trigger ---
+def threshold_lags(mask, starts, triggers):
+    runs = run_lengths(mask, starts)
+    has_prev = (triggers >= 0) & (triggers > starts)
+    lags = np.where(has_prev, runs[np.where(has_prev, triggers - 1, 0)], 0).astype(float)
+    lags[lags == 0] = np.nan
+    return lags
+
+
+# --- Trigger week and lags for every block at once ---
+def compute_triggers(df, index, thresholds=DEFAULT_THRESHOLDS):
+    keys, starts, stops = block_bounds(index)
+    groups = block_ids(starts, stops)
+    cases = df["dengue_cases"].to_numpy(dtype=float)
+    triggers = trigger_rows(cases, groups, len(keys))
+
+    weeks = df["week_start_date"].to_numpy()
+    trigger_dates = np.where(triggers >= 0, weeks[np.maximum(triggers, 0)], np.datetime64("NaT"))
+
+    result = pd.DataFrame(
+        {"trigger_date": pd.to_datetime(trigger_dates)},
+        index=pd.MultiIndex.from_tuples(keys, names=["dtname_disp", "sdtname_disp"]),
+    )
+    masks = threshold_masks(df, thresholds)
+    for name in LAG_VARIABLES:
+        result[f"lag_{name}_weeks"] = threshold_lags(masks[name], starts, triggers)
+    return result
+
+
+# --- Cached building blocks (keyed by dataset version and mask bounds) ---
+@cache_resource(max_entries=2, show_spinner=False)
+def load_block_layout(version):
+    keys, starts, stops = block_bounds(load_weekly_index(version))
+    return {"keys": keys, "starts": starts, "groups": block_ids(starts, stops)}
+
+
+@cache_resource(max_entries=2, show_spinner=False)
+def load_trigger_rows(version):
+    layout = load_block_layout(version)
+    cases = load_weekly_data(version)["dengue_cases"].to_numpy(dtype=float)
+    return trigger_rows(cases, layout["groups"], len(layout["keys"]))
+
+
+@cache_resource(max_entries=32, show_spinner=False)
+def load_mask(version, name, bounds):
+    return variable_mask(load_weekly_data(version), name, dict(bounds))
+
+
+@cache_resource(max_entries=32, show_spinner=False)
+def load_intervals(version, name, bounds):
+    layout = load_block_layout(version)
+    weeks = load_weekly_data(version)["week_start_date"].to_numpy()
+    return mask_intervals(load_mask(version, name, bounds), layout["groups"], weeks, len(layout["keys"]))
+
+
+@cache_resource(max_entries=32, show_spinner=False)
+def load_lags(version, name, bounds):
+    layout = load_block_layout(version)
+    return threshold_lags(load_mask(version, name, bounds), layout["starts"], load_trigger_rows(version))
+
+
+# --- Statewide breeding-condition batch ---
+# One pass over the full weekly table: per-(block, week) flags and run lengths
+# from the raw climate columns, plus per-block case co-occurrence statistics
+# from grouped sums (bincount over block ids). Weekly rows keep the frame's
+# (district, block, week) order and refer to blocks by position.
+def compute_breeding_table(df, index, flag):
+    keys, starts, stops = block_bounds(index)
+    groups = block_ids(starts, stops)
+    n_blocks = len(keys)
+    cases = np.nan_to_num(df["dengue_cases"].to_numpy(dtype=float))
+    has_cases = cases > 0
+    runs = run_lengths(flag, starts)
+
+    weekly = pd.DataFrame({
+        "block": groups.astype(np.int32),
+        "week_start_date": df["week_start_date"].to_numpy(),
+        "meets_threshold": flag,
+        "run_length": runs.astype(np.int16),
+        "dengue_cases": cases.astype(np.float32),
+    })
+
+    def per_block(weights=None):
+        return np.bincount(groups, weights=weights, minlength=n_blocks)
+
+    def count_per_block(mask):
+        return per_block(mask.astype(float)).astype(np.int32)
+
+    blocks = pd.DataFrame({
+        "weeks": per_block().astype(np.int32),
+        "flagged_weeks": count_per_block(flag),
+        "case_weeks": count_per_block(has_cases),
+        "flagged_case_weeks": count_per_block(flag & has_cases),
+        "cases": per_block(cases),
+        "flagged_cases": per_block(np.where(flag, cases, 0)),
+        "longest_run": np.maximum.reduceat(runs, starts) if len(runs) else np.zeros(0, dtype=int),
+    }, index=pd.MultiIndex.from_tuples(keys, names=["dtname_disp", "sdtname_disp"]))
+    blocks["flagged_case_share"] = (blocks["flagged_cases"] / blocks["cases"]).where(blocks["cases"] > 0)
+    return {"weekly": weekly, "blocks": blocks}
+
+
+@cache_resource(max_entries=8, show_spinner=False)
+def load_breeding_table(version, bounds):
+    flag = load_mask(version, "all", bounds)
+    return compute_breeding_table(load_weekly_data(version), load_weekly_index(version), flag)
+
+
+# --- Per-block lookups for the current thresholds ---
+def block_trigger_date(version, index, key):
+    row = load_trigger_rows(version)[index["positions"][key]]
+    return load_weekly_data(version)["week_start_date"].iloc[row] if row >= 0 else pd.NaT
+
+
+def block_lag(version, index, key, name, thresholds):
+    return load_lags(version, name, mask_bounds(name, thresholds))[index["positions"][key]]
+
+
+def block_highlight_ranges(version, index, key, name, thresholds):
+    intervals = load_intervals(version, name, mask_bounds(name, thresholds))
+    return block_intervals(intervals, index["positions"][key])
+
+
+# --- Sidebar threshold controls (shared by the weekly pages) ---
+def threshold_sidebar():
+    d = DEFAULT_THRESHOLDS
+    with st.sidebar.expander("Thresholds"):
+        max_temp = st.slider("Max temperature: TMax ≤ (°C)", 25.0, 45.0, float(d["max_temp"]), 0.5, key="thr_max_temp")
+        min_temp = st.slider("Min temperature: TMin ≥ (°C)", 5.0, 30.0, float(d["min_temp"]), 0.5, key="thr_min_temp")
+        min_rh, max_rh = st.slider("Relative humidity range (%)", 0.0, 100.0,
+                                   (float(d["min_rh"]), float(d["max_rh"])), 1.0, key="thr_rh")
+        min_rainfall, max_rainfall = st.slider("Weekly rainfall range (mm)", 0.0, 300.0,
+                                               (float(d["min_rainfall"]), float(d["max_rainfall"])), 0.5,
+                                               key="thr_rainfall")
+    return {
+        "max_temp": max_temp,
+        "min_temp": min_temp,
+        "min_rh": min_rh,
+        "max_rh": max_rh,
+        "min_rainfall": min_rainfall,
+        "max_rainfall": max_rainfall,
+    }
+
+
+def block_breeding_summary(version, index, key, thresholds):
+    table = load_breeding_table(version, mask_bounds("all", thresholds))
+    return table["blocks"].iloc[index["positions"][key]]
+
+
+def breeding_summary_text(row):
+    text = (f"Breeding conditions met in **{int(row['flagged_weeks'])} of {int(row['weeks'])}** weeks "
+            f"(longest run: {int(row['longest_run'])} weeks)")
+    if pd.notna(row["flagged_case_share"]):
+        text += f"; **{row['flagged_case_share']:.0%}** of dengue cases were reported in those weeks"
+    return text + "."
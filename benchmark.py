@@ -0,0 +1,200 @@
+"""Headless benchmark for the dashboard's data and page pipelines.
+
+Writes a synthetic dataset (synthetic.py) at each (weeks, blocks) scale into
+a scratch directory, points the app at it as a local data source, then
+times every stage outside the Streamlit server: bulk fetch into the cache
+directory, CSV -> Feather, memory-mapped load, block index and options,
+per-block selection, the statewide analysis engine, and full page reruns
+through AppTest (cold, block switch, cached rerun) with figure payload sizes.
+Data stages report peak traced allocations; each scale also reports the
+process peak RSS.
+
+    python benchmark.py
+    python benchmark.py --weeks 26 520 --blocks 30 350 --json bench.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+import data_store  # noqa: E402
+import analysis  # noqa: E402
+import synthetic  # noqa: E402
+import warmup  # noqa: E402
+
+PAGES = {
+    "weekly": "pages/1_Weekly_Trends.py",
+    "monthly": "pages/2_Monthly_Trends.py",
+    "top_blocks": "pages/3_Top_Blocks_Trends.py",
+}
+DEFAULT_WEEKS = [26, 104, 520]
+DEFAULT_BLOCKS = [30, 120, 350]
+PAGE_TIMEOUT = 600
+BENCH_START = "2015-01-05"
+BENCH_VERSION = "bench"  # version token for the data-stage Feather files
+
+
+# --- Stage measurement: best-of-N wall time, then one traced run for peak memory ---
+def measure(fn, repeat=1):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, best, peak
+
+
+def clear_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+# --- Data-layer stages (extracted functions, no server) ---
+def bench_data(repeat):
+    stages = {}
+
+    def record(name, fn, reps=repeat):
+        result, seconds, peak = measure(fn, reps)
+        stages[name] = {"seconds": seconds, "peak_mb": peak / 2**20}
+        return result
+
+    def convert():
+        for name in (data_store.WEEKLY_CSV, data_store.MONTHLY_CSV):
+            data_store.prune_versions(data_store.data_path(name), None, ".feather")
+        return data_store.to_feather(data_store.data_path(data_store.WEEKLY_CSV), BENCH_VERSION,
+                                     data_store.WEEKLY_CATEGORY_COLS, parse=data_store._parse_weekly,
+                                     sort_cols=data_store.WEEKLY_SORT_COLS)
+
+    feather_path = record("csv_to_feather", convert, reps=1)
+    df = record("load_feather", lambda: data_store.read_feather(feather_path))
+    index = record("block_index", lambda: data_store.build_block_index(df))
+    record("weekly_options", lambda: data_store.build_weekly_options(index))
+
+    keys = list(index["blocks"])
+    picks = [keys[i] for i in np.random.default_rng(0).choice(len(keys), min(50, len(keys)), replace=False)]
+    record("select_50_blocks", lambda: [data_store.select_block(df, index, *key) for key in picks])
+    record("triggers_and_lags", lambda: analysis.compute_triggers(df, index))
+    flag = analysis.threshold_masks(df)["all"]
+    record("breeding_table", lambda: analysis.compute_breeding_table(df, index, flag))
+
+    monthly = record("monthly_load", lambda: data_store.read_feather(data_store.to_feather(
+        data_store.data_path(data_store.MONTHLY_CSV), BENCH_VERSION, data_store.MONTHLY_CATEGORY_COLS,
+        parse=data_store._parse_monthly, sort_cols=data_store.MONTHLY_SORT_COLS)))
+    record("monthly_cube", lambda: data_store.build_monthly_cube(monthly))
+    return stages
+
+
+# --- Page stages: full reruns through AppTest ---
+def switch_selection(at, page):
+    if page == "weekly":
+        box = next(s for s in at.selectbox if s.label == "Select District")
+        box.select_index(min(1, len(box.options) - 1))
+    elif page == "monthly":
+        at.multiselect[0].set_value(at.multiselect[0].options[:3])
+    else:
+        box = next(s for s in at.selectbox if s.label == "Select Block")
+        box.select_index(min(1, len(box.options) - 1))
+    return at
+
+
+def payload_bytes(at):
+    return sum(len(chart.proto.spec) for chart in at.get("plotly_chart"))
+
+
+def bench_page(page):
+    clear_caches()
+    path = os.path.join(REPO_DIR, PAGES[page])
+    at = AppTest.from_file(path, default_timeout=PAGE_TIMEOUT)
+    results = {}
+
+    # Each step changes cache state, so it runs once, untraced; memory for the
+    # page stages is the process peak RSS reported per scale.
+    def record(name, fn):
+        start = time.perf_counter()
+        fn()
+        seconds = time.perf_counter() - start
+        if at.exception:
+            raise RuntimeError(f"{page}: {at.exception[0].value}")
+        results[name] = {"seconds": seconds, "payload_kb": payload_bytes(at) / 1024}
+
+    record("page_cold", at.run)
+    record("page_switch", lambda: switch_selection(at, page).run())
+    record("page_cached", at.run)
+    return results
+
+
+def run_scale(n_weeks, n_blocks, repeat, pages):
+    workdir = tempfile.mkdtemp(prefix="vbd_bench_")
+    try:
+        source_dir, cache_dir = os.path.join(workdir, "source"), os.path.join(workdir, "cache")
+        synthetic.write_dataset(source_dir, n_blocks, n_weeks, start=BENCH_START,
+                                n_months=max(12, round(n_weeks / 4.35)))
+        os.environ[data_store.LOCAL_DATA_ENV] = source_dir
+        os.environ[data_store.DATA_DIR_ENV] = cache_dir
+        os.environ[warmup.NO_WARMUP_ENV] = "1"  # pages would otherwise pre-fill the caches being timed
+        clear_caches()
+        start = time.perf_counter()
+        errors = data_store.fetch_all_artifacts()
+        failed = {k: e for k, e in errors.items() if e is not None and not data_store.ARTIFACTS[k].get("optional")}
+        if failed:
+            raise RuntimeError(f"fetch failed: {failed}")
+        stages = {"fetch_all": {"seconds": time.perf_counter() - start}}
+        stages.update(bench_data(repeat))
+        for page in pages:
+            for name, result in bench_page(page).items():
+                stages[f"{page}/{name}"] = result
+        stages["process_peak_rss"] = {"peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+        return stages
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_table(results):
+    for (n_weeks, n_blocks), stages in results.items():
+        print(f"\n== {n_weeks} weeks x {n_blocks} blocks ==")
+        print(f"{'stage':<28}{'seconds':>10}{'peak MB':>10}{'payload KB':>12}")
+        for name, r in stages.items():
+            seconds = f"{r['seconds']:>10.4f}" if "seconds" in r else f"{'':>10}"
+            peak = f"{r['peak_mb']:>10.1f}" if "peak_mb" in r else f"{'':>10}"
+            payload = f"{r['payload_kb']:>12.1f}" if "payload_kb" in r else ""
+            print(f"{name:<28}{seconds}{peak}{payload}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--weeks", type=int, nargs="+", default=DEFAULT_WEEKS)
+    parser.add_argument("--blocks", type=int, nargs="+", default=DEFAULT_BLOCKS)
+    parser.add_argument("--pages", nargs="*", choices=list(PAGES), default=list(PAGES))
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per data stage (best is reported)")
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    for n_weeks in args.weeks:
+        for n_blocks in args.blocks:
+            results[(n_weeks, n_blocks)] = run_scale(n_weeks, n_blocks, args.repeat, args.pages)
+            print_table({(n_weeks, n_blocks): results[(n_weeks, n_blocks)]})
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([{"weeks": w, "blocks": b, "stages": s} for (w, b), s in results.items()], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import json
+import plotly.graph_objects as go
+import plotly.io as pio
+import streamlit as st
+from instrument import cache_data, stage, note
+
+# --- Figure cache ---
+# Finished figures are cached as JSON in a bounded LRU (st.cache_data evicts the
+# least recently used entry once max_entries is reached), keyed by
+# (page, district, block, dataset version, params). A hit skips all Plotly
+# construction; the figure is rebuilt from JSON without re-validating it.
+FIGURE_CACHE_SIZE = 64
+
+
+@cache_data(max_entries=FIGURE_CACHE_SIZE, show_spinner=False)
+def _figure_json(page, district, block, version, params, _build):
+    return pio.to_json(_build(), validate=False)
+
+
+def cached_figure(page, district, block, version, build, params=()):
+    with stage("figure_build"):
+        fig_json = _figure_json(page, district, block, version, params, build)
+    note("figure_bytes", len(fig_json))
+    with stage("figure_decode"):
+        return go.Figure(json.loads(fig_json), _validate=False)
+
+
+# --- Subplot shapes, built as plain dicts ---
+# fig.add_vrect / add_vline re-validate every existing shape on each call, which
+# grows quadratically with the number of highlight runs; pages collect these
+# dicts and set layout.shapes once instead.
+def subplot_refs(fig, row, col, secondary_y=False):
+    axes = fig.get_subplot(row, col, secondary_y=secondary_y)
+    return axes.xaxis.plotly_name.replace("axis", ""), axes.yaxis.plotly_name.replace("axis", "")
+
+
+def vrect_shape(refs, x0, x1, **style):
+    return dict(type="rect", xref=refs[0], yref=f"{refs[1]} domain", x0=x0, x1=x1, y0=0, y1=1, **style)
+
+
+def vline_shape(refs, x, line):
+    return dict(type="line", xref=refs[0], yref=f"{refs[1]} domain", x0=x, x1=x, y0=0, y1=1, line=line)
+
+
+# --- Trace rendering mode ---
+# SVG scatter traces slow down the browser once a figure carries a few thousand
+# points; past WEBGL_POINTS (or when chosen explicitly) line traces become
+# Scattergl. Bars have no WebGL variant and stay as they are.
+WEBGL_POINTS = 2000
+RENDER_MODES = {"Auto": "auto", "SVG": "svg", "WebGL": "webgl"}
+
+
+def render_mode_sidebar():
+    label = st.sidebar.radio("Rendering", list(RENDER_MODES), horizontal=True, key="render_mode",
+                             help="Auto switches to WebGL for figures with many points.")
+    return RENDER_MODES[label]
+
+
+def use_webgl(mode, n_points):
+    return mode == "webgl" or (mode == "auto" and n_points > WEBGL_POINTS)
+
+
+def line_trace(webgl, **kwargs):
+    return go.Scattergl(**kwargs) if webgl else go.Scatter(**kwargs)
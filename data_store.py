@@ -0,0 +1,338 @@
+import glob
+import hashlib
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+import streamlit as st
+from instrument import cache_resource, stage
+from fetcher import ensure_file, fetch_missing, refresh_in_background, dataset_version
+from utils import DriveSource, LocalSource, HttpSource, district_sort_keys, subdistrict_sort_keys, sorted_names, epoch_ms
+
+# --- Dataset files (Drive IDs for the Drive source) ---
+WEEKLY_CSV = "time_series_dashboard.csv"
+WEEKLY_FILE_ID = "1ad-PcGSpk6YoO-ZolodMWfvFq64kO-Z_"
+WEEKLY_CATEGORY_COLS = ["dtname", "sdtname", "dtname_disp", "sdtname_disp"]
+WEEKLY_SORT_COLS = ["dtname_disp", "sdtname_disp", "week_start_date"]
+
+MONTHLY_CSV = "dist_ts_dashboard.csv"
+MONTHLY_FILE_ID = "16UGTNwPCGs7fO5XN4vYahfa7mCnnMBxD"
+MONTHLY_CATEGORY_COLS = ["dtname", "dtname_disp"]
+MONTHLY_SORT_COLS = ["dtname_disp", "Year_Month"]
+MONTHLY_METRICS = ["dengue_cases", "temperature_2m_max", "temperature_2m_min",
+                   "relative_humidity_2m_mean", "rain_sum"]
+CLIMATOLOGY_YEARS = (2022, 2024)
+
+BOUNDARY_GEOJSON = "rj_block_boundaries.geojson"
+
+# Pre-rendered breeding-conditions animation, shown by the map page until a
+# block boundary file is provisioned
+GIF_PATH = "breeding_conditions_cases.gif"
+GIF_FILE_ID = "1q5xMFHqlDcokgHX8cumuIRQ4NxPaFmTc"
+
+# Everything the pages download, by artifact key. Optional artifacts may be
+# missing from a source: the boundary file has no Drive copy yet (it comes from
+# a local or mirror source, or is placed by hand), and the GIF is only a fallback.
+ARTIFACTS = {
+    "weekly": {"name": WEEKLY_CSV, "file_id": WEEKLY_FILE_ID},
+    "monthly": {"name": MONTHLY_CSV, "file_id": MONTHLY_FILE_ID},
+    "boundaries": {"name": BOUNDARY_GEOJSON, "file_id": None, "optional": True},
+    "gif": {"name": GIF_PATH, "file_id": GIF_FILE_ID, "optional": True},
+}
+
+# --- Data source and shared cache directory (environment) ---
+# VBD_MIRROR_URL: HTTP mirror / S3-compatible bucket URL holding the files by name
+# VBD_LOCAL_DATA: a local directory holding the files; with VBD_SYNTHETIC=1 an
+#                 empty or new directory is filled with a synthetic dataset
+#                 (see synthetic.py), otherwise missing files are an error
+# otherwise:      Google Drive, with st.secrets["gdrive_creds"]
+# Whatever the source, files are cached in VBD_DATA_DIR (default: the working
+# directory) under one manifest, and refreshed in the background.
+DATA_DIR_ENV = "VBD_DATA_DIR"
+MIRROR_URL_ENV = "VBD_MIRROR_URL"
+LOCAL_DATA_ENV = "VBD_LOCAL_DATA"
+SYNTHETIC_ENV = "VBD_SYNTHETIC"
+
+
+def data_dir():
+    return os.environ.get(DATA_DIR_ENV) or "."
+
+
+def data_path(name):
+    return os.path.join(data_dir(), name)
+
+
+def source_config():
+    if os.environ.get(MIRROR_URL_ENV):
+        return ("http", os.environ[MIRROR_URL_ENV])
+    if os.environ.get(LOCAL_DATA_ENV):
+        return ("local", os.environ[LOCAL_DATA_ENV])
+    return ("drive", None)
+
+
+@cache_resource(max_entries=4, show_spinner=False)
+def load_data_source(config):
+    kind, location = config
+    if kind == "http":
+        return HttpSource(location)
+    if kind == "local":
+        paths = {a["name"]: os.path.join(location, a["name"]) for a in ARTIFACTS.values()}
+        if os.environ.get(SYNTHETIC_ENV) == "1" and not any(map(os.path.exists, paths.values())):
+            import synthetic
+            synthetic.write_dataset(location)
+        missing = [a["name"] for a in ARTIFACTS.values()
+                   if not a.get("optional") and not os.path.exists(paths[a["name"]])]
+        if missing:
+            raise FileNotFoundError(f"{LOCAL_DATA_ENV}={location} is missing {', '.join(missing)} "
+                                    f"(set {SYNTHETIC_ENV}=1 to generate a synthetic dataset there)")
+        return LocalSource(location)
+    return DriveSource(lambda: st.secrets["gdrive_creds"])
+
+
+def data_source():
+    return load_data_source(source_config())
+
+
+def artifact_paths():
+    return {data_path(artifact["name"]): artifact for artifact in ARTIFACTS.values()}
+
+
+# --- Download into the cache (verified, atomic; see fetcher) ---
+# Blocks only when there is no local copy, and then fetches every missing
+# artifact in parallel rather than one page at a time. An existing copy is
+# served as-is while a background refresh swaps in a newer verified file.
+def ensure_downloaded(key):
+    artifact = ARTIFACTS[key]
+    path = data_path(artifact["name"])
+    source = data_source()
+    if os.path.exists(path):
+        refresh_in_background(source, artifact, path)
+        return path
+    os.makedirs(data_dir(), exist_ok=True)
+    fetch_missing(source, artifact_paths())
+    return ensure_file(source, artifact, path)
+
+
+# Bulk fetch of every artifact (e.g. at startup): {key: None or the error}
+def fetch_all_artifacts():
+    os.makedirs(data_dir(), exist_ok=True)
+    jobs = fetch_missing(data_source(), artifact_paths())
+    errors = {}
+    for key, artifact in ARTIFACTS.items():
+        job = jobs.get(data_path(artifact["name"]))
+        errors[key] = job.exception() if job is not None else None
+    return errors
+
+
+# --- Dataset version tokens (from the fetcher manifest) ---
+# Called on every rerun: makes sure the file exists, kicks the periodic
+# background check, and returns the token that keys every cache below.
+def weekly_data_version():
+    return dataset_version(WEEKLY_CSV, ensure_downloaded("weekly"))
+
+
+def monthly_data_version():
+    return dataset_version(MONTHLY_CSV, ensure_downloaded("monthly"))
+
+
+# None when no source has a boundary file (optional artifact)
+def boundary_version():
+    try:
+        return dataset_version(BOUNDARY_GEOJSON, ensure_downloaded("boundaries"))
+    except FileNotFoundError:
+        return None
+
+
+# --- Derived files (Feather, GeoParquet) are keyed by the dataset version ---
+# The version goes into the file name, so a file built from an older download
+# is never served under a newer version token. mtimes cannot tell: os.replace
+# keeps the temp file's mtime, so a swapped-in CSV can look older than a file
+# derived from its predecessor. Superseded versions are deleted after a rebuild.
+def versioned_path(source_path, version, ext):
+    token = hashlib.md5(str(version).encode()).hexdigest()[:12]
+    return f"{os.path.splitext(source_path)[0]}.{token}{ext}"
+
+
+def prune_versions(source_path, keep, ext):
+    pattern = glob.escape(os.path.splitext(source_path)[0]) + ".[0-9a-f]*" + ext
+    for path in glob.glob(pattern):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# --- Convert a CSV into a typed, uncompressed Feather file (once per version) ---
+# Rows are stored sorted by sort_cols so every selection is a contiguous slice.
+def to_feather(csv_path, version, category_cols, parse=None, sort_cols=None):
+    feather_path = versioned_path(csv_path, version, ".feather")
+    if os.path.exists(feather_path):
+        return feather_path
+
+    with stage("read_csv"):
+        df = pd.read_csv(csv_path)
+    if parse is not None:
+        df = parse(df)
+    for col in category_cols:
+        df[col] = df[col].astype(str).str.strip().astype("category")
+    if sort_cols:
+        df = df.sort_values(sort_cols, kind="stable").reset_index(drop=True)
+
+    # Write to a temp file first so a concurrent reader never sees a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(feather_path)), suffix=".part")
+    os.close(fd)
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, feather_path)
+    prune_versions(csv_path, feather_path, ".feather")
+    return feather_path
+
+
+# --- Memory-mapped read; numeric columns without nulls are not copied ---
+def read_feather(feather_path):
+    table = feather.read_table(feather_path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def _parse_weekly(df):
+    df["week_start_date"] = pd.to_datetime(df["week_start_date"])
+    return df
+
+
+def _parse_monthly(df):
+    df["Year_Month"] = pd.to_datetime(df["Year_Month"], format="%Y-%m")
+    return df
+
+
+# --- Shared in-process frames ---
+# cache_resource hands every session the same object, so pages must treat these
+# frames as read-only (filter/slice them, never assign columns in place).
+# Keyed by dataset version; max_entries drops the superseded version once a
+# new one is loaded, without flushing anything else.
+@cache_resource(max_entries=2, show_spinner="Loading weekly data...")
+def load_weekly_data(version):
+    return read_feather(to_feather(data_path(WEEKLY_CSV), version, WEEKLY_CATEGORY_COLS, parse=_parse_weekly,
+                                   sort_cols=WEEKLY_SORT_COLS))
+
+
+@cache_resource(max_entries=2, show_spinner="Loading monthly data...")
+def load_monthly_data(version):
+    return read_feather(to_feather(data_path(MONTHLY_CSV), version, MONTHLY_CATEGORY_COLS, parse=_parse_monthly,
+                                   sort_cols=MONTHLY_SORT_COLS))
+
+
+# --- (district, block) row-slice index ---
+# The weekly frame is sorted by (district, block, week), so each block and each
+# district occupies one contiguous run of rows. Run boundaries are found from
+# the category codes in a single vectorized pass.
+def build_block_index(df):
+    dt_codes = df["dtname_disp"].cat.codes.to_numpy()
+    sdt_codes = df["sdtname_disp"].cat.codes.to_numpy()
+    n = len(df)
+
+    block_breaks = np.flatnonzero((dt_codes[1:] != dt_codes[:-1]) | (sdt_codes[1:] != sdt_codes[:-1])) + 1
+    block_starts = np.r_[0, block_breaks] if n else np.array([], dtype=int)
+    block_stops = np.r_[block_breaks, n] if n else np.array([], dtype=int)
+
+    dt_names = df["dtname_disp"].to_numpy()
+    sdt_names = df["sdtname_disp"].to_numpy()
+
+    blocks = {}
+    districts = {}
+    for start, stop in zip(block_starts.tolist(), block_stops.tolist()):
+        key = (dt_names[start], sdt_names[start])
+        blocks[key] = slice(start, stop)
+        district = districts.get(key[0])
+        districts[key[0]] = slice(district.start if district else start, stop)
+
+    # Position of each block in slice order, for per-block arrays built from this index
+    positions = {key: i for i, key in enumerate(blocks)}
+    return {"blocks": blocks, "districts": districts, "positions": positions}
+
+
+@cache_resource(max_entries=2, show_spinner=False)
+def load_weekly_index(version):
+    return build_block_index(load_weekly_data(version))
+
+
+# --- Selection helper: a dict lookup plus a slice, already sorted by week ---
+def select_block(df, index, selected_dt, selected_sdt):
+    rows = index["blocks"].get((selected_dt, selected_sdt))
+    return df.iloc[rows] if rows is not None else df.iloc[0:0]
+
+
+# --- Sidebar option lists (sorted once per loaded dataset, shared by all pages) ---
+def build_weekly_options(index):
+    keys = pd.DataFrame(list(index["blocks"]), columns=["dtname_disp", "sdtname_disp"])
+    block_keys = subdistrict_sort_keys(keys["sdtname_disp"])
+    block_keys["dtname_disp"] = keys["dtname_disp"].astype(str)
+    block_keys = block_keys[block_keys["lower"] != "all"].sort_values(["tier", "rank", "lower"])
+
+    blocks = {dt: ["All"] for dt in index["districts"]}
+    for dt, names in block_keys.groupby("dtname_disp", sort=False)["name"]:
+        blocks[dt] = ["All"] + names.tolist()
+
+    return {
+        "districts": ["All"] + sorted_names(district_sort_keys(list(index["districts"]))),
+        "blocks": blocks,
+    }
+
+
+@cache_resource(max_entries=2, show_spinner=False)
+def load_weekly_options(version):
+    return build_weekly_options(load_weekly_index(version))
+
+
+# --- Monthly cube: (district, month) -> metric, one contiguous float array per metric ---
+# Rows follow the dtname_disp categories, columns are every calendar month in
+# the data range (missing months stay NaN), so a district is one row slice and a
+# month-on-month shift is a column offset. Year-over-year deltas and the
+# per-calendar-month climatology are derived once from the same arrays.
+def build_monthly_cube(df):
+    names = df["dtname_disp"].cat.categories.astype(str).tolist()
+    rows = df["dtname_disp"].cat.codes.to_numpy()
+    month_ord = (df["Year_Month"].dt.year * 12 + df["Year_Month"].dt.month - 1).to_numpy()
+    first = int(month_ord.min())
+    months = pd.date_range(df["Year_Month"].min(), periods=int(month_ord.max()) - first + 1, freq="MS")
+    cols = month_ord - first
+
+    years = months.year.to_numpy()
+    in_climatology = (years >= CLIMATOLOGY_YEARS[0]) & (years <= CLIMATOLOGY_YEARS[1])
+    calendar = (months.month.to_numpy()[:, None] == np.arange(1, 13)) & in_climatology[:, None]
+
+    values, yoy, climatology = {}, {}, {}
+    for metric in MONTHLY_METRICS:
+        arr = np.full((len(names), len(months)), np.nan)
+        arr[rows, cols] = df[metric].to_numpy(dtype=float)
+        values[metric] = arr
+
+        delta = np.full_like(arr, np.nan)
+        delta[:, 12:] = arr[:, 12:] - arr[:, :-12]
+        yoy[metric] = delta
+
+        present = ~np.isnan(arr)
+        sums = np.where(present, arr, 0.0) @ calendar
+        counts = present.astype(float) @ calendar
+        with np.errstate(invalid="ignore", divide="ignore"):
+            climatology[metric] = np.where(counts > 0, sums / counts, np.nan)
+
+    return {
+        "positions": {name: i for i, name in enumerate(names)},
+        "months": months,
+        "months_ms": epoch_ms(months),
+        "values": values,
+        "yoy": yoy,
+        "climatology": climatology,
+    }
+
+
+@cache_resource(max_entries=2, show_spinner=False)
+def load_monthly_cube(version):
+    return build_monthly_cube(load_monthly_data(version))
+
+
+@cache_resource(max_entries=2, show_spinner=False)
+def load_monthly_options(version):
+    names = load_monthly_data(version)["dtname_disp"].cat.categories
+    return {"districts": ["All"] + sorted_names(district_sort_keys(names))}
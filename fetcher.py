@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from filelock import FileLock
+
+logger = logging.getLogger(__name__)
+
+# --- Process-wide download workers ---
+# One job per local path at a time: sessions that need the same file wait on
+# the same future instead of starting their own download. Works with any data
+# source from utils (Drive, local directory, HTTP mirror).
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="data-fetch")
+_jobs = {}
+_last_refresh = {}
+_unavailable = {}  # path -> when the source last said it does not have the file
+_jobs_lock = threading.Lock()
+
+REFRESH_INTERVAL = 300  # seconds between background checks of the same file
+MANIFEST_NAME = "data_manifest.json"  # one per cache directory
+_manifest_cache = {}
+
+
+def md5sum(path, chunk_size=1 << 20):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# --- Verify a downloaded file against its source metadata ---
+def verify_download(path, remote, name):
+    expected_size = remote.get("fileSize")
+    if expected_size is not None and os.path.getsize(path) != int(expected_size):
+        raise IOError(f"Size mismatch for {name}: got {os.path.getsize(path)}, expected {expected_size}")
+
+    expected_md5 = remote.get("md5Checksum")
+    if expected_md5 is not None and md5sum(path) != expected_md5:
+        raise IOError(f"MD5 mismatch for {name}")
+
+
+# --- Version manifest: source metadata of each local copy, per artifact name ---
+# Lives next to the files it describes, so every backend sharing a cache
+# directory shares one manifest. Re-read from disk only when the manifest file
+# changes, so checking the dataset version on every rerun is a single stat call.
+def manifest_for(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), MANIFEST_NAME)
+
+
+def read_manifest(manifest_path):
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    cached = _manifest_cache.get(manifest_path)
+    if cached is None or cached[0] != mtime:
+        with open(manifest_path) as f:
+            cached = (mtime, json.load(f))
+        _manifest_cache[manifest_path] = cached
+    return cached[1]
+
+
+def record_version(name, path, remote, source_label):
+    manifest_path = manifest_for(path)
+    with FileLock(manifest_path + ".lock"):
+        entries = dict(read_manifest(manifest_path))
+        entries[name] = {
+            "path": os.path.abspath(path),
+            "source": source_label,
+            "md5Checksum": remote.get("md5Checksum"),
+            "modifiedDate": remote.get("modifiedDate"),
+            "fileSize": remote.get("fileSize"),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(manifest_path)), suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+
+# --- Dataset version token: feeds every loader, index and figure cache key ---
+def dataset_version(name, path):
+    entry = read_manifest(manifest_for(path)).get(name)
+    if entry is not None and entry["path"] == os.path.abspath(path):
+        return f"{entry['modifiedDate']}-{entry['md5Checksum'] or entry['fileSize']}"
+    # Local copy that predates the manifest: fall back to the file itself
+    stat = os.stat(path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
+# Same content as the source? By MD5 when the source has one, otherwise by the
+# (modifiedDate, fileSize) recorded for the local copy.
+def _unchanged(name, path, remote):
+    entry = read_manifest(manifest_for(path)).get(name)
+    if entry is not None and entry["path"] != path:
+        entry = None
+    if remote.get("md5Checksum"):
+        local_md5 = entry["md5Checksum"] if entry is not None and entry["md5Checksum"] else md5sum(path)
+        return remote["md5Checksum"] == local_md5
+    return entry is not None and (entry["modifiedDate"], entry["fileSize"]) == (remote.get("modifiedDate"), remote.get("fileSize"))
+
+
+# --- Download to a temp file, verify, then atomically rename into place ---
+# The file lock makes this safe across processes; the local copy is only ever
+# replaced by a complete, verified file. Returns True if the file changed.
+def download(source, artifact, path):
+    path = os.path.abspath(path)
+    name = artifact["name"]
+    with FileLock(path + ".lock"):
+        remote = source.metadata(artifact)
+        if remote is None:
+            # Not published by this source: keep serving a local copy if there is one
+            if os.path.exists(path):
+                return False
+            # Recorded before the job completes, so submit() reuses this answer
+            # rather than re-probing the source on every rerun
+            _unavailable[path] = time.monotonic()
+            raise FileNotFoundError(f"{name} is not available from the {source.label} source")
+        _unavailable.pop(path, None)
+
+        # Unchanged at the source, or another process finished the same
+        # download while we waited: only make sure the manifest knows this version
+        if os.path.exists(path) and _unchanged(name, path, remote):
+            if name not in read_manifest(manifest_for(path)):
+                record_version(name, path, remote, source.label)
+            return False
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".", suffix=".part")
+        os.close(fd)
+        try:
+            source.fetch(artifact, remote, tmp_path)
+            verify_download(tmp_path, remote, name)
+            os.replace(tmp_path, path)
+            record_version(name, path, remote, source.label)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return True
+
+
+def _log_failure(job):
+    error = job.exception()
+    # Optional artifacts a source does not publish are routine, not failures
+    if isinstance(error, FileNotFoundError):
+        logger.debug("Background fetch skipped: %s", error)
+    elif error is not None:
+        logger.warning("Background fetch failed: %s", error)
+
+
+def submit(source, artifact, path):
+    path = os.path.abspath(path)
+    with _jobs_lock:
+        job = _jobs.get(path)
+        missing_at = _unavailable.get(path)
+        # A finished "not available" answer is reused (re-raising on result())
+        # until REFRESH_INTERVAL has passed, like refresh_in_background
+        if job is None or job.done() and (missing_at is None or time.monotonic() - missing_at >= REFRESH_INTERVAL):
+            job = _executor.submit(download, source, artifact, path)
+            job.add_done_callback(_log_failure)
+            _jobs[path] = job
+        return job
+
+
+# --- Public entry points ---
+# ensure_file only blocks when there is no local copy yet; refresh_in_background
+# keeps serving the existing copy while a newer one is fetched and swapped in.
+def ensure_file(source, artifact, path):
+    if not os.path.exists(path):
+        submit(source, artifact, path).result()
+    return path
+
+
+def refresh_in_background(source, artifact, path, min_interval=REFRESH_INTERVAL):
+    key = os.path.abspath(path)
+    now = time.monotonic()
+    with _jobs_lock:
+        last = _last_refresh.get(key)
+        if last is not None and now - last < min_interval:
+            return _jobs.get(key)
+        _last_refresh[key] = now
+    return submit(source, artifact, path)
+
+
+# --- Bulk fetch: every missing artifact at once, one worker each ---
+# Returns {path: job}; callers wait on the ones they need (or all of them).
+def fetch_missing(source, artifacts):
+    return {path: submit(source, artifact, path) for path, artifact in artifacts.items()
+            if not os.path.exists(path)}
@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+import geopandas as gpd
+import numpy as np
+import shapely
+from instrument import cache_resource
+from analysis import block_bounds, load_breeding_table
+from data_store import load_weekly_data, load_weekly_index, data_path, boundary_version, versioned_path, \
+    prune_versions, BOUNDARY_GEOJSON
+
+# --- Block boundaries (polygons with dtname / sdtname attributes) ---
+# Simplification tolerance (degrees) per zoom level: statewide view, one district
+ZOOM_TOLERANCES = {"state": 0.01, "district": 0.002}
+
+
+def block_key(dtname, sdtname):
+    return dtname + "|" + sdtname
+
+
+def _zoom_column(zoom):
+    return f"geometry_{zoom}"
+
+
+# --- Convert the boundary source into GeoParquet (once per boundary version) ---
+# Stores the full-resolution polygons plus one pre-simplified geometry column
+# per zoom level and a representative point per block. Simplification is
+# coverage-aware, so neighbouring blocks keep a shared border with no gaps or
+# overlaps. Request-time code never runs a spatial operation.
+def to_geoparquet(source_path, version):
+    parquet_path = versioned_path(source_path, version, ".parquet")
+    if os.path.exists(parquet_path):
+        return parquet_path
+
+    gdf = gpd.read_file(source_path)[["dtname", "sdtname", "geometry"]].to_crs(epsg=4326)
+    gdf["dtname"] = gdf["dtname"].astype(str).str.strip()
+    gdf["sdtname"] = gdf["sdtname"].astype(str).str.strip()
+    gdf["block_key"] = block_key(gdf["dtname"], gdf["sdtname"])
+    gdf["geometry"] = shapely.make_valid(gdf.geometry.values)
+
+    for zoom, tolerance in ZOOM_TOLERANCES.items():
+        gdf[_zoom_column(zoom)] = gpd.GeoSeries(
+            shapely.coverage_simplify(gdf.geometry.values, tolerance), crs=gdf.crs
+        )
+    points = gdf.geometry.representative_point()
+    gdf["lon"] = points.x.round(5)
+    gdf["lat"] = points.y.round(5)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(parquet_path)), suffix=".part")
+    os.close(fd)
+    gdf.to_parquet(tmp_path)
+    os.replace(tmp_path, parquet_path)
+    prune_versions(source_path, parquet_path, ".parquet")
+    return parquet_path
+
+
+# --- Boundaries per boundary version, keyed by (dtname, sdtname) ---
+@cache_resource(max_entries=2, show_spinner="Loading block boundaries...")
+def load_block_boundaries(version):
+    parquet = to_geoparquet(data_path(BOUNDARY_GEOJSON), version)
+    return gpd.read_parquet(parquet).set_index("block_key", drop=False)
+
+
+# --- GeoJSON + centroids per (zoom level, district) (serialized once, shared by every page) ---
+# district is a raw dtname; None means every block in the state.
+@cache_resource(max_entries=64, show_spinner=False)
+def load_block_geojson(version, zoom, district=None):
+    gdf = load_block_boundaries(version)
+    if district is not None:
+        gdf = gdf[gdf["dtname"] == district]
+    layer = gpd.GeoDataFrame({"block_key": gdf["block_key"]}, geometry=gdf[_zoom_column(zoom)].values, crs=gdf.crs)
+    return {
+        "geojson": json.loads(layer.to_json(drop_id=True)),
+        "centroids": dict(zip(gdf["block_key"], zip(gdf["lon"], gdf["lat"]))),
+    }
+
+
+# Current boundary version, or None while no boundary file is available (not
+# cached, so a file provisioned later is picked up on the next rerun)
+def block_geojson(zoom, district=None):
+    version = boundary_version()
+    return None if version is None else load_block_geojson(version, zoom, district)
+
+
+# --- Week x block attribute arrays for the map (from the breeding batch) ---
+# Rows are weeks, columns are block positions in the weekly index, so each
+# animation frame is one row of each array.
+@cache_resource(max_entries=8, show_spinner=False)
+def load_map_arrays(version, bounds):
+    df = load_weekly_data(version)
+    keys, starts, _ = block_bounds(load_weekly_index(version))
+    weekly = load_breeding_table(version, bounds)["weekly"]
+
+    weeks = np.unique(weekly["week_start_date"].to_numpy())
+    week_codes = np.searchsorted(weeks, weekly["week_start_date"].to_numpy())
+    blocks = weekly["block"].to_numpy()
+
+    flags = np.zeros((len(weeks), len(keys)), dtype=np.int8)
+    flags[week_codes, blocks] = weekly["meets_threshold"].to_numpy()
+    cases = np.zeros((len(weeks), len(keys)), dtype=np.float32)
+    cases[week_codes, blocks] = weekly["dengue_cases"].to_numpy()
+
+    dt_disp = np.array([k[0] for k in keys], dtype=object)
+    sdt_disp = np.array([k[1] for k in keys], dtype=object)
+    dtname = df["dtname"].astype(str).to_numpy()[starts].astype(object)
+    locations = block_key(dtname, df["sdtname"].astype(str).to_numpy()[starts].astype(object))
+    return {
+        "weeks": weeks,
+        "flags": flags,
+        "cases": cases,
+        "locations": locations,
+        "dtname": dtname,
+        "dtname_disp": dt_disp,
+        "sdtname_disp": sdt_disp,
+        # District/state aggregate rows have no polygon of their own
+        "is_block": (dt_disp != "All") & (sdt_disp != "All"),
+    }
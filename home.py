@@ -1,7 +1,11 @@
 import streamlit as st
+from warmup import start_warmup, warmup_status
 
 st.set_page_config(page_title="Dengue-Climate Dashboard", layout="wide")
 
+# --- Fetch and load every dataset in the background (once per process) ---
+start_warmup()
+
 st.title("Dengue & Climate Trends in Rajasthan")
 
 st.markdown("""
@@ -21,3 +25,9 @@ Use the sidebar to explore the following pages:
 - Dengue Cases (NVBDCP)
 - Climate data (ERA5) extracted from the open-meteo API for 10km x 10km grid, and aggregated at the district/block/month/week levels.
 """)
+
+status = warmup_status()
+if status["state"] == "warming":
+    st.caption("Loading datasets in the background; pages may take a moment on first open.")
+elif status["state"] == "failed":
+    st.caption("Some datasets could not be preloaded; pages will load them on first open.")
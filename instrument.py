@@ -0,0 +1,156 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+import streamlit as st
+
+# --- Hot-path instrumentation ---
+# Opt-in per session (sidebar "Debug panel" toggle or ?debug=1) or server-wide
+# by setting VBD_PERF_LOG to a log file path. When neither is on, stage() hands
+# back one shared no-op context manager and cache counting is a dict increment.
+PERF_LOG_ENV = "VBD_PERF_LOG"
+DEBUG_KEY = "perf_debug"
+
+_active = threading.local()
+_totals = Counter()
+_totals_lock = threading.Lock()
+_NULL = nullcontext()
+
+perf_logger = logging.getLogger("vbd.perf")
+if os.environ.get(PERF_LOG_ENV) and not perf_logger.handlers:
+    _handler = logging.FileHandler(os.environ[PERF_LOG_ENV])
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    perf_logger.addHandler(_handler)
+    perf_logger.setLevel(logging.INFO)
+    perf_logger.propagate = False
+
+
+def _current():
+    return getattr(_active, "record", None)
+
+
+# --- Per-rerun record: one per script run, on the script thread ---
+def begin_run(page):
+    if DEBUG_KEY not in st.session_state and st.query_params.get("debug") == "1":
+        st.session_state[DEBUG_KEY] = True
+    # Drawn here rather than in debug_panel() so pages that st.stop() early
+    # still render the widget and keep its state
+    debug = st.sidebar.toggle("Debug panel", key=DEBUG_KEY)
+    enabled = debug or bool(os.environ.get(PERF_LOG_ENV))
+    _active.record = {
+        "page": page,
+        "start": time.perf_counter(),
+        "stages": [],
+        "metrics": {},
+        "cache": Counter(),
+    } if enabled else None
+
+
+class _Stage:
+    __slots__ = ("record", "name", "start")
+
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.record["stages"].append((self.name, time.perf_counter() - self.start))
+
+
+def stage(name):
+    record = _current()
+    return _NULL if record is None else _Stage(record, name)
+
+
+def note(name, value):
+    record = _current()
+    if record is not None:
+        record["metrics"][name] = value
+
+
+# --- Cache hit/miss counters ---
+# Drop-in for st.cache_resource / st.cache_data: the inner function only runs on
+# a miss, the outer one on every call, so hits = calls - misses.
+def _count(name, event):
+    with _totals_lock:
+        _totals[(name, event)] += 1
+    record = _current()
+    if record is not None:
+        record["cache"][(name, event)] += 1
+
+
+def _counted(decorator, **kwargs):
+    def wrap(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def on_miss(*args, **kw):
+            _count(name, "misses")
+            return fn(*args, **kw)
+
+        cached_fn = decorator(**kwargs)(on_miss)
+
+        @functools.wraps(fn)
+        def call(*args, **kw):
+            _count(name, "calls")
+            return cached_fn(*args, **kw)
+
+        call.clear = cached_fn.clear
+        return call
+    return wrap
+
+
+def cache_resource(**kwargs):
+    return _counted(st.cache_resource, **kwargs)
+
+
+def cache_data(**kwargs):
+    return _counted(st.cache_data, **kwargs)
+
+
+def cache_table(counts):
+    names = sorted({name for name, _ in counts})
+    rows = []
+    for name in names:
+        calls, misses = counts[(name, "calls")], counts[(name, "misses")]
+        rows.append({"cache": name, "calls": calls, "hits": calls - misses, "misses": misses})
+    return rows
+
+
+# --- Sidebar debug panel + structured log line (end of every page) ---
+def debug_panel():
+    record = _current()
+    _active.record = None
+    if record is None:
+        return
+
+    total = time.perf_counter() - record["start"]
+    entry = {
+        "ts": time.time(),
+        "page": record["page"],
+        "total_s": round(total, 6),
+        "stages": {name: round(seconds, 6) for name, seconds in record["stages"]},
+        "metrics": record["metrics"],
+        "cache": cache_table(record["cache"]),
+    }
+    perf_logger.info(json.dumps(entry))
+
+    if st.session_state.get(DEBUG_KEY):
+        with st.sidebar.expander("Performance (this rerun)", expanded=True):
+            st.caption(f"Total script time: {total * 1000:.1f} ms")
+            st.dataframe([{"stage": name, "ms": round(seconds * 1000, 2)} for name, seconds in record["stages"]],
+                         hide_index=True, width="stretch")
+            for name, value in record["metrics"].items():
+                st.caption(f"{name}: {value:,}")
+            st.dataframe(entry["cache"], hide_index=True, width="stretch")
+            with _totals_lock:
+                totals = cache_table(_totals)
+            st.caption("Process totals")
+            st.dataframe(totals, hide_index=True, width="stretch")
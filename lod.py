@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from instrument import cache_resource
+from analysis import block_bounds, block_ids
+from utils import epoch_ms
+from data_store import load_weekly_data, load_weekly_index
+
+# --- Level of detail ---
+# A chart never sends more than MAX_POINTS points per trace: the visible range
+# picks the finest aggregation level that fits, and LTTB downsampling covers
+# anything still over budget. Tick spacing is chosen the same way.
+MAX_POINTS = 260
+MAX_TICKS = 40
+MARKER_POINTS = 120  # draw markers only when points are this sparse
+
+LEVELS = ["weekly", "monthly", "seasonal"]
+LEVEL_DAYS = {"weekly": 7, "monthly": 30.44, "seasonal": 91.31}
+# Seasons are Dec-Feb, Mar-May, Jun-Aug, Sep-Nov (quarters ending in November)
+LEVEL_PERIODS = {"monthly": "M", "seasonal": "Q-NOV"}
+
+# How each weekly column rolls up into a coarser bucket
+WEEKLY_AGGREGATIONS = {
+    "dengue_cases": "sum",
+    "temperature_2m_max": "mean",
+    "temperature_2m_min": "mean",
+    "relative_humidity_2m_mean": "mean",
+    "rain_sum": "sum",
+}
+
+TICK_STEPS = [
+    (7, 604800000, "%d-%b-%y"),
+    (14, 1209600000, "%d-%b-%y"),
+    (30.44, "M1", "%b %Y"),
+    (91.31, "M3", "%b %Y"),
+    (182.6, "M6", "%b %Y"),
+    (365.25, "M12", "%Y"),
+]
+
+
+def choose_level(start, end, max_points=MAX_POINTS):
+    span_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for level in LEVELS:
+        if span_days / LEVEL_DAYS[level] <= max_points:
+            return level
+    return LEVELS[-1]
+
+
+def axis_ticks(start, end, max_ticks=MAX_TICKS):
+    span_days = (pd.Timestamp(end) - pd.Timestamp(start)).days + 1
+    for days, dtick, tickformat in TICK_STEPS:
+        if span_days / days <= max_ticks:
+            break
+    return dict(dtick=dtick, tickformat=tickformat)
+
+
+def trace_mode(n_points):
+    return "lines+markers" if n_points <= MARKER_POINTS else "lines"
+
+
+# --- Pre-aggregation of the whole weekly frame to one level ---
+# The frame is sorted by (block, week), so each (block, period) bucket is one
+# contiguous run of rows and every level is a single reduceat per column.
+# "offsets" gives each block's bucket range, in weekly-index position order;
+# "x_ms" is the same dates as chart-ready epoch milliseconds.
+def aggregate_level(df, index, level):
+    _, starts, stops = block_bounds(index)
+    dates = df["week_start_date"]
+    if level == "weekly":
+        return {
+            "dates": dates.to_numpy(),
+            "x_ms": epoch_ms(dates),
+            "values": {col: df[col].to_numpy(dtype=float) for col in WEEKLY_AGGREGATIONS},
+            "offsets": np.r_[starts, len(df)],
+        }
+
+    groups = block_ids(starts, stops)
+    period = dates.dt.to_period(LEVEL_PERIODS[level])
+    codes = period.array.asi8
+    breaks = np.flatnonzero((codes[1:] != codes[:-1]) | (groups[1:] != groups[:-1])) + 1
+    bucket_starts = np.r_[0, breaks]
+
+    values = {}
+    for col, how in WEEKLY_AGGREGATIONS.items():
+        arr = df[col].to_numpy(dtype=float)
+        present = ~np.isnan(arr)
+        sums = np.add.reduceat(np.where(present, arr, 0.0), bucket_starts)
+        counts = np.add.reduceat(present.astype(np.int64), bucket_starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values[col] = np.where(counts > 0, sums if how == "sum" else sums / counts, np.nan)
+
+    bucket_dates = period.iloc[bucket_starts].dt.start_time.to_numpy()
+    return {
+        "dates": bucket_dates,
+        "x_ms": epoch_ms(bucket_dates),
+        "values": values,
+        "offsets": np.searchsorted(bucket_starts, np.r_[starts, len(df)]),
+    }
+
+
+@cache_resource(max_entries=6, show_spinner=False)
+def load_level(version, level):
+    return aggregate_level(load_weekly_data(version), load_weekly_index(version), level)
+
+
+# --- Largest-Triangle-Three-Buckets downsampling ---
+# Keeps the first and last points and, per bucket, the point forming the
+# largest triangle with the previous pick and the next bucket's mean.
+def lttb_indices(x, y, n_out):
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.nan_to_num(np.asarray(y, dtype=float))
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    picks = np.empty(n_out, dtype=np.int64)
+    picks[0], picks[-1] = 0, n - 1
+    prev = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nxt_hi = edges[b + 2] if b + 2 < len(edges) else n
+        mean_x = x[hi:nxt_hi].mean()
+        mean_y = y[hi:nxt_hi].mean()
+        area = np.abs((x[prev] - mean_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (mean_y - y[prev]))
+        prev = lo + int(np.argmax(area))
+        picks[b + 1] = prev
+    return picks
+
+
+# --- One block's series for the visible range, at the level that fits ---
+# Returns {column: (x in epoch ms, values)}.
+def block_series(version, index, key, start, end, columns=tuple(WEEKLY_AGGREGATIONS), max_points=MAX_POINTS):
+    level = choose_level(start, end, max_points)
+    data = load_level(version, level)
+    position = index["positions"][key]
+    lo, hi = data["offsets"][position], data["offsets"][position + 1]
+    dates = data["dates"][lo:hi]
+    # Buckets overlapping [start, end]: the one containing start through the last one starting by end
+    first = max(np.searchsorted(dates, np.datetime64(pd.Timestamp(start)), side="right") - 1, 0)
+    last = np.searchsorted(dates, np.datetime64(pd.Timestamp(end)), side="right")
+    visible = slice(first, last)
+    x = data["x_ms"][lo:hi][visible]
+    values = {col: data["values"][col][lo:hi][visible] for col in columns}
+
+    if len(x) > max_points:
+        for col in columns:
+            picks = lttb_indices(x, values[col], max_points)
+            values[col] = (x[picks], values[col][picks])
+        return level, values
+    return level, {col: (x, vals) for col, vals in values.items()}
@@ -1,62 +1,63 @@
 import streamlit as st
 import pandas as pd
-import os
-from datetime import timedelta
 from plotly.subplots import make_subplots
-import plotly.graph_objects as go
-from utils import load_drive, get_sorted_districts, get_sorted_subdistricts
+from data_store import load_weekly_data, load_weekly_index, load_weekly_options, select_block, weekly_data_version
+from charts import (cached_figure, render_mode_sidebar, use_webgl, line_trace, subplot_refs,
+                    vrect_shape, vline_shape)
+from lod import block_series, axis_ticks, trace_mode
+from analysis import (threshold_sidebar, block_trigger_date, block_lag, block_highlight_ranges,
+                      block_breeding_summary, breeding_summary_text)
+from instrument import begin_run, stage, debug_panel
+from warmup import start_warmup
 from datetime import timedelta
 
 st.set_page_config(page_title="Weekly Time Series - Dengue & Climate", layout="wide")
+begin_run("weekly")
+start_warmup()
 
-# --- Load data from Google Drive only if not already downloaded ---
-csv_path = "time_series_dashboard.csv"
-file_id = "1ad-PcGSpk6YoO-ZolodMWfvFq64kO-Z_"
-
-if not os.path.exists(csv_path):
-    drive = load_drive(st.secrets["gdrive_creds"])
-    downloaded = drive.CreateFile({'id': file_id})
-    downloaded.GetContentFile(csv_path)
-
-# --- Load CSV ---
-@st.cache_data
-def load_weekly_data():
-    df = pd.read_csv(csv_path, parse_dates=["week_start_date"])
-    df['dtname'] = df['dtname'].astype(str).str.strip()
-    df['sdtname'] = df['sdtname'].astype(str).str.strip()
-    df['dtname_disp'] = df['dtname_disp'].astype(str).str.strip()
-    df['sdtname_disp'] = df['sdtname_disp'].astype(str).str.strip()
-    return df
-
-df = load_weekly_data()
+# --- Load data (shared, memory-mapped copy of the current dataset version) ---
+with stage("load"):
+    version = weekly_data_version()
+    df = load_weekly_data(version)
+    index = load_weekly_index(version)
+    options = load_weekly_options(version)
 
 # --- Sidebar filters ---
-districts = get_sorted_districts(df)
+districts = options["districts"]
 selected_dt = st.sidebar.selectbox("Select District", districts)
-subdistricts = get_sorted_subdistricts(df[df['dtname_disp'] == selected_dt])
+subdistricts = options["blocks"].get(selected_dt, ["All"])
 selected_sdt = st.sidebar.selectbox("Select Block", subdistricts)
+thresholds = threshold_sidebar()
+render_mode = render_mode_sidebar()
 
-# --- Filter based on selection ---
-filtered = df[(df['dtname_disp'] == selected_dt) & (df['sdtname_disp'] == selected_sdt)]
+# --- Filter based on selection (index lookup; rows already sorted by week) ---
+with stage("filter"):
+    filtered = select_block(df, index, selected_dt, selected_sdt)
 if filtered.empty:
     st.warning("No data available for this selection.")
     st.stop()
 
-filtered = filtered.sort_values("week_start_date")
-week_dates = filtered["week_start_date"]
-x_start = filtered["week_start_date"].min()
-x_end = filtered["week_start_date"].max()
-
-# --- Extract trigger and lags ---
-# Ensure trigger is datetime
-trigger = filtered["trigger_date"].iloc[0]
-
-# Extract lags
-lag_all = filtered["lag_all_weeks"].iloc[0]
-lag_min = filtered["lag_min_weeks"].iloc[0]
-lag_max = filtered["lag_max_weeks"].iloc[0]
-lag_hum = filtered["lag_hum_weeks"].iloc[0]
-lag_rainfall = filtered["lag_rainfall_weeks"].iloc[0]
+# --- Visible range: picks the aggregation level (weekly / monthly / seasonal) ---
+first_week = filtered["week_start_date"].min()
+last_week = filtered["week_start_date"].max()
+x_start, x_end = first_week, last_week
+if first_week < last_week:
+    visible = st.sidebar.slider("Visible range", min_value=first_week.date(), max_value=last_week.date(),
+                                value=(first_week.date(), last_week.date()), step=timedelta(weeks=1),
+                                format="DD-MMM-YY")
+    x_start, x_end = pd.Timestamp(visible[0]), pd.Timestamp(visible[1])
+
+# --- Trigger and lags (computed in-app for every block at once, cached) ---
+# Each lag only depends on its own variable's thresholds, so moving one slider
+# recomputes just that variable's mask, intervals and lag.
+block_key = (selected_dt, selected_sdt)
+with stage("triggers_lags"):
+    trigger = block_trigger_date(version, index, block_key)
+    lag_all = block_lag(version, index, block_key, "all", thresholds)
+    lag_min = block_lag(version, index, block_key, "min", thresholds)
+    lag_max = block_lag(version, index, block_key, "max", thresholds)
+    lag_hum = block_lag(version, index, block_key, "hum", thresholds)
+    lag_rainfall = block_lag(version, index, block_key, "rainfall", thresholds)
 
 # Compute onsets safely
 onset_all = pd.to_datetime(trigger) - timedelta(weeks=int(lag_all)) if pd.notnull(lag_all) else None
@@ -66,139 +67,145 @@ onset_hum = pd.to_datetime(trigger) - timedelta(weeks=int(lag_hum)) if pd.notnul
 onset_rainfall = pd.to_datetime(trigger) - timedelta(weeks=int(lag_rainfall)) if pd.notnull(lag_rainfall) else None
 
 
-lag_min = filtered["lag_min_weeks"].iloc[0]
-lag_max = filtered["lag_max_weeks"].iloc[0]
-lag_hum = filtered["lag_hum_weeks"].iloc[0]
-lag_rainfall = filtered["lag_rainfall_weeks"].iloc[0]
-    
-
 def fmt_lag(val):
     return f"{int(val)} week{'s' if int(val) != 1 else ''}" if pd.notna(val) else "Threshold not met continuously before trigger week"
 
-# --- Subplot titles ---
-subplot_titles = [
-    f"Dengue Cases (Weekly Mean TMax < 36°C AND Weekly Mean TMin ≥ 18°C OR Weekly Mean RH ≥ 60%): {fmt_lag(lag_all)}",
-    f"Weekly Mean TMax (°C) (Threshold: < 36°C; Lag: {fmt_lag(lag_max)})",
-    f"Weekly Mean TMin (°C) (Threshold: ≥ 18°C; Lag: {fmt_lag(lag_min)})",
-    f"Weekly Mean RH (%) (Threshold: ≥ 60%; Lag: {fmt_lag(lag_hum)})",
-    f"Weekly Cumulative Rainfall (mm) (Threshold: 0.5–150 mm; Lag: {fmt_lag(lag_rainfall)})"
-]
-
-# --- Create subplot figure ---
-fig = make_subplots(
-    rows=5, cols=1, shared_xaxes=False,
-    vertical_spacing=0.05,
-    subplot_titles=subplot_titles
-)
-
-# --- Trace plotting helper ---
-def add_trace(row, col, y_data_col, trace_name, color, highlight_cond=None, highlight_color=None, lag_val=None, onset_date=None):
-
-    fig.add_trace(go.Scatter(
-        x=week_dates,
-        y=filtered[y_data_col],
-        name=trace_name,
-        mode="lines+markers",
-        marker=dict(size=4),
-        line=dict(color=color)
-    ), row=row, col=col)
-
-    fig.update_yaxes(
-        title_text=trace_name,
-        row=row,
-        col=col,
-        showgrid=True,
-        zeroline=True,
-        gridcolor='lightgray',
-        tickfont=dict(size=12, color='black'),
-        title_font=dict(size=12, color="black"),
-        range=[0, None]
-    )
+# --- Build figure (only on a figure-cache miss) ---
+def build_weekly_figure():
+    # --- Subplot titles ---
+    t = thresholds
+    subplot_titles = [
+        f"Dengue Cases (Weekly Mean TMax ≤ {t['max_temp']:g}°C AND Weekly Mean TMin ≥ {t['min_temp']:g}°C "
+        f"OR Weekly Mean RH {t['min_rh']:g}–{t['max_rh']:g}%): {fmt_lag(lag_all)}",
+        f"Weekly Mean TMax (°C) (Threshold: ≤ {t['max_temp']:g}°C; Lag: {fmt_lag(lag_max)})",
+        f"Weekly Mean TMin (°C) (Threshold: ≥ {t['min_temp']:g}°C; Lag: {fmt_lag(lag_min)})",
+        f"Weekly Mean RH (%) (Threshold: {t['min_rh']:g}–{t['max_rh']:g}%; Lag: {fmt_lag(lag_hum)})",
+        f"Weekly Cumulative Rainfall (mm) (Threshold: {t['min_rainfall']:g}–{t['max_rainfall']:g} mm; Lag: {fmt_lag(lag_rainfall)})"
+    ]
+
+    # --- Series at the level of detail that fits the visible range ---
+    with stage("series"):
+        level, series = block_series(version, index, block_key, x_start, x_end)
+    webgl = use_webgl(render_mode, sum(len(x) for x, _ in series.values()))
+    if level != "weekly":
+        subplot_titles = [f"{title} — {level} totals/means" for title in subplot_titles]
+
+    # --- Create subplot figure ---
+    with stage("make_subplots"):
+        fig = make_subplots(
+            rows=5, cols=1, shared_xaxes=False,
+            vertical_spacing=0.05,
+            subplot_titles=subplot_titles
+        )
+    shapes = []
+
+    # --- Trace plotting helper ---
+    def add_trace(row, col, y_data_col, trace_name, color, highlight=None, highlight_color=None, lag_val=None, onset_date=None):
+
+        x_vals, y_vals = series[y_data_col]
+        fig.add_trace(line_trace(
+            webgl,
+            x=x_vals,
+            y=y_vals,
+            name=trace_name,
+            mode=trace_mode(len(x_vals)),
+            marker=dict(size=4),
+            line=dict(color=color)
+        ), row=row, col=col)
+
+        fig.update_yaxes(
+            title_text=trace_name,
+            row=row,
+            col=col,
+            showgrid=True,
+            zeroline=True,
+            gridcolor='lightgray',
+            tickfont=dict(size=12, color='black'),
+            title_font=dict(size=12, color="black"),
+            range=[0, None]
+        )
 
-    if highlight_cond is not None and highlight_color:
-        highlight_weeks = filtered[highlight_cond]
-        for dt in highlight_weeks["week_start_date"].drop_duplicates():
-            fig.add_vrect(
-                x0=dt,
-                x1=dt + timedelta(days=6),
-                fillcolor=highlight_color,
-                opacity=0.1,
-                line_width=0,
-                layer="below",
-                row=row, col=col
-            )
-
-    # Trigger line
-
-    # Trigger line
-    if pd.notnull(trigger):
-        fig.add_vline(
-            x=trigger,
-            line=dict(color="black", width=2, dash="dash"),
-            row=row, col=col
+        # One shape per run of consecutive qualifying weeks (only runs in view)
+        refs = subplot_refs(fig, row, col)
+        if highlight is not None and highlight_color:
+            for start, end in block_highlight_ranges(version, index, block_key, highlight, thresholds):
+                if end < x_start or start > x_end:
+                    continue
+                shapes.append(vrect_shape(refs, start, end, fillcolor=highlight_color, opacity=0.1,
+                                          line_width=0, layer="below"))
+
+        # Trigger line
+        if pd.notnull(trigger):
+            shapes.append(vline_shape(refs, trigger, dict(color="black", width=2, dash="dash")))
+        if pd.notnull(onset_date):
+            shapes.append(vline_shape(refs, onset_date, dict(color="red", width=2, dash="dot")))
+
+    # --- Add all traces ---
+    add_trace(1, 1, "dengue_cases", "Dengue Cases (Weekly Sum)", "crimson",
+              highlight="all", highlight_color="red",
+              lag_val=lag_all, onset_date=onset_all)
+
+    add_trace(2, 1, "temperature_2m_max", "Max Temperature (°C) (Weekly Mean)", "orange",
+              highlight="max", highlight_color="orange",
+              lag_val=lag_max, onset_date=onset_max)
+
+    add_trace(3, 1, "temperature_2m_min", "Min Temperature (°C) (Weekly Mean)", "blue",
+              highlight="min", highlight_color="blue",
+              lag_val=lag_min, onset_date=onset_min)
+
+    add_trace(4, 1, "relative_humidity_2m_mean", "Relative Humidity (%) (Weekly Mean)", "green",
+              highlight="hum", highlight_color="green",
+              lag_val=lag_hum, onset_date=onset_hum)
+
+    add_trace(5, 1, "rain_sum", "Rainfall (mm) (Weekly Sum)", "purple",
+              highlight="rainfall", highlight_color="purple",
+              lag_val=lag_rainfall, onset_date=onset_rainfall)
+
+    with stage("shapes"):
+        fig.update_layout(shapes=shapes)
+
+    # --- X-axis formatting (tick spacing scales with the visible range) ---
+    ticks = axis_ticks(x_start, x_end)
+    for i in range(1, 6):
+        fig.update_xaxes(
+            row=i, col=1,
+            type="date",  # x values are epoch milliseconds
+            tickangle=-45,
+            tickfont=dict(size=10, color='black'),
+            ticks="outside",
+            showgrid=True,
+            gridcolor='lightgray',
+            range=[x_start, x_end],
+            tick0=first_week,
+            **ticks
         )
-    if pd.notnull(onset_date):
-        fig.add_vline(
-        x=onset_date,
-        line=dict(color="red", width=2, dash="dot"),
-        row=row, col=col)
-
-# --- Add all traces ---
-add_trace(1, 1, "dengue_cases", "Dengue Cases (Weekly Sum)", "crimson",
-          highlight_cond=(filtered["meets_threshold"]), highlight_color="red",
-          lag_val=lag_all, onset_date=onset_all)
-
-add_trace(2, 1, "temperature_2m_max", "Max Temperature (°C) (Weekly Mean)", "orange",
-          highlight_cond=(filtered["temperature_2m_max"] <= 35), highlight_color="orange",
-          lag_val=lag_max, onset_date=onset_max)
-
-add_trace(3, 1, "temperature_2m_min", "Min Temperature (°C) (Weekly Mean)", "blue",
-          highlight_cond=(filtered["temperature_2m_min"] >= 18), highlight_color="blue",
-          lag_val=lag_min, onset_date=onset_min)
-
-add_trace(4, 1, "relative_humidity_2m_mean", "Relative Humidity (%) (Weekly Mean)", "green",
-          highlight_cond=(filtered["relative_humidity_2m_mean"] >= 60), highlight_color="green",
-          lag_val=lag_hum, onset_date=onset_hum)
-
-add_trace(5, 1, "rain_sum", "Rainfall (mm) (Weekly Sum)", "purple",
-          highlight_cond=filtered["rain_sum"].between(0.5, 150, inclusive="both"), highlight_color="purple",
-          lag_val=lag_rainfall, onset_date=onset_rainfall)
-
-# --- X-axis formatting ---
-for i in range(1, 6):
-    fig.update_xaxes(
-        row=i, col=1,
-        tickangle=-45,
-        tickformat="%d-%b-%y",
-        tickfont=dict(size=10, color='black'),
-        ticks="outside",
-        showgrid=True,
-        gridcolor='lightgray',
-        dtick=604800000,
-        range=[x_start, x_end],
-        tick0=filtered["week_start_date"].iloc[0]
+
+    # --- Layout ---
+    fig.update_layout(
+        title=dict(
+            text=f"Weekly Trends (Jul–Dec 2024) — Block: {selected_sdt}, District: {selected_dt}",
+            font=dict(size=24, color='black'),
+            x=0.5,  # Center the title
+            xanchor='center'
+        ),
+        font=dict(color='black'),
+        showlegend=False,
+        height=2100,
+        width=3000,
+        margin=dict(t=80, b=100),
+        plot_bgcolor="white",
+        paper_bgcolor="white"
     )
 
-# --- Layout ---
-fig.update_layout(
-    title=dict(
-        text=f"Weekly Trends (Jul–Dec 2024) — Block: {selected_sdt}, District: {selected_dt}",
-        font=dict(size=24, color='black'),
-        x=0.5,  # Center the title
-        xanchor='center'
-    ),
-    font=dict(color='black'),
-    showlegend=False,
-    height=2100,
-    width=3000,
-    margin=dict(t=80, b=100),
-    plot_bgcolor="white",
-    paper_bgcolor="white"
-)
+    return fig
 
 
+fig = cached_figure("weekly", selected_dt, selected_sdt, version, build_weekly_figure,
+                    params=(tuple(sorted(thresholds.items())), x_start, x_end, render_mode))
+
 # --- Plotly chart output ---
-st.plotly_chart(fig, use_container_width=True)
+with stage("plotly_chart"):
+    st.plotly_chart(fig, use_container_width=True)
 
 # --- Additional context ---
 pct_blocks = filtered["pct_blocks_with_cases"].iloc[0] if "pct_blocks_with_cases" in filtered.columns else None
@@ -207,8 +214,12 @@ if pd.notna(pct_blocks):
                 f"**{pct_blocks:.1f}%** of blocks in this district reported at least one dengue case between Jul 2024 and Dec 2024."
                 f"</div>", unsafe_allow_html=True)
 
+st.markdown(breeding_summary_text(block_breeding_summary(version, index, block_key, thresholds)))
+
 st.markdown("""
 **Trigger Week**: Point when cases show a sharp and sustained increase in dengue cases begins:
 - It shows a ≥50% increase in cases compared to the previous 2-week average, and
 - The average cases over the next 3 weeks remains ≥40% higher than the previous 2-week average.
 """)
+
+debug_panel()
@@ -1,143 +1,160 @@
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
+import plotly.colors as pc
 from plotly.subplots import make_subplots
-from utils import load_drive, get_sorted_districts
-import json
-import os
-import tempfile
-from datetime import timedelta
-from pydrive2.auth import GoogleAuth
-from pydrive2.drive import GoogleDrive
-from oauth2client.service_account import ServiceAccountCredentials
-import re
+from data_store import load_monthly_cube, load_monthly_options, monthly_data_version, CLIMATOLOGY_YEARS
+from charts import cached_figure, render_mode_sidebar, use_webgl, line_trace
+from lod import axis_ticks, trace_mode
+from instrument import begin_run, stage, debug_panel
+from warmup import start_warmup
 
 st.set_page_config(page_title="Monthly Dengue Trends (2022-2024)", layout="wide")
+begin_run("monthly")
+start_warmup()
 
-# --- Load Google Drive credentials and file ---
-@st.cache_resource
-def load_monthly_drive():
-    creds_dict = dict(st.secrets["gdrive_creds"])
-    return load_drive(creds_dict)
-
-# --- Download file if not exists ---
-csv_path = "dist_ts_dashboard.csv"
-file_id="16UGTNwPCGs7fO5XN4vYahfa7mCnnMBxD"
-
-if not os.path.exists(csv_path):
-    drive = load_drive(st.secrets["gdrive_creds"])
-    downloaded = drive.CreateFile({'id': file_id})
-    downloaded.GetContentFile(csv_path)
-
-# --- Load CSV ---
-@st.cache_data
-def load_monthly_data():
-    df = pd.read_csv(csv_path)
-    df['Year_Month'] = pd.to_datetime(df['Year_Month'], format="%Y-%m")
-    df['dtname'] = df['dtname'].astype(str).str.strip()
-    df['dtname_disp'] = df['dtname_disp'].astype(str).str.strip()
-    return df
-
-df = load_monthly_data()
+# --- Load data (precomputed (district, month) cube of the current dataset version) ---
+with stage("load"):
+    version = monthly_data_version()
+    cube = load_monthly_cube(version)
+    districts = load_monthly_options(version)["districts"]
 
 # --- Sidebar filters ---
-districts = get_sorted_districts(df)
-selected_dt = st.sidebar.selectbox("Select District", districts)
-
-# --- Filter based on selection ---
-filtered = df[df['dtname_disp'] == selected_dt]
-if filtered.empty:
+selected = st.sidebar.multiselect("Select Districts", districts, default=["All"],
+                                  help="Pick several districts to overlay them; 'All' is Rajasthan as a whole.")
+VIEWS = {
+    "Monthly values": "values",
+    "Year-over-year change": "yoy",
+    f"Climatology ({CLIMATOLOGY_YEARS[0]}-{CLIMATOLOGY_YEARS[1]} mean)": "climatology",
+}
+# Year-over-year needs more than one year of months
+if len(cube["months"]) <= 12:
+    del VIEWS["Year-over-year change"]
+view_label = st.sidebar.radio("View", list(VIEWS))
+view = VIEWS[view_label]
+render_mode = render_mode_sidebar()
+
+# --- Slice the cube: one row per selected district ---
+selected = [dt for dt in selected if dt in cube["positions"]]
+if not selected:
     st.warning("No data available for this selection.")
     st.stop()
-
-filtered = filtered.sort_values("Year_Month")
-x_vals = filtered["Year_Month"]
-x_start = filtered["Year_Month"].min()
-x_end = filtered["Year_Month"].max()
-
-fig = make_subplots(
-    rows=5, cols=1, shared_xaxes=False,
-    vertical_spacing=0.05,
-  subplot_titles = [
-    "Total Dengue Cases",
-    "Mean Maximum Temperature",
-    "Mean Minimum Temperature",
-    "Mean Relative Humidity (%)",
-    "Total Rainfall (mm)"
-]
-)
-
-# --- Add Traces ---
-def add_trace(row, col, y_data_col, trace_name, color):
-    fig.add_trace(go.Scatter(
-        x=x_vals,
-        y=filtered[y_data_col],
-        name=trace_name,
-        mode="lines+markers",
-        marker=dict(size=4),
-        line=dict(color=color)
-    ), row=row, col=col)
-
-    fig.update_yaxes(
-        title_text=trace_name,
-        row=row,
-        col=col,
-        showgrid=True,
-        zeroline=True,
-        gridcolor='lightgray',
-        tickfont=dict(size=12, color='black'),
-        title_font=dict(size=12, color="black"),
-        range=[0, None]
+rows = [cube["positions"][dt] for dt in selected]
+
+if view == "climatology":
+    x_vals = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+else:
+    # Year-over-year has no value for the first year of data
+    first = 12 if view == "yoy" else 0
+    x_vals = cube["months_ms"][first:]
+    x_start = cube["months"][first]
+    x_end = cube["months"][-1]
+
+# --- Build figure (only on a figure-cache miss) ---
+def build_monthly_figure():
+    with stage("make_subplots"):
+        fig = make_subplots(
+            rows=5, cols=1, shared_xaxes=False,
+            vertical_spacing=0.05,
+          subplot_titles = [
+            "Total Dengue Cases",
+            "Mean Maximum Temperature",
+            "Mean Minimum Temperature",
+            "Mean Relative Humidity (%)",
+            "Total Rainfall (mm)"
+        ]
+        )
+
+    # --- Add Traces (one per selected district) ---
+    palette = pc.qualitative.Plotly
+    webgl = use_webgl(render_mode, 5 * len(selected) * len(x_vals))
+    def add_trace(row, col, y_data_col, trace_name, color):
+        series = cube[view][y_data_col]
+        for i, (dt, pos) in enumerate(zip(selected, rows)):
+            y = series[pos] if view == "climatology" else series[pos, first:]
+            fig.add_trace(line_trace(
+                webgl,
+                x=x_vals,
+                y=y,
+                name=dt if len(selected) > 1 else trace_name,
+                legendgroup=dt,
+                showlegend=len(selected) > 1 and row == 1,
+                mode=trace_mode(len(x_vals)),
+                marker=dict(size=4),
+                line=dict(color=color if len(selected) == 1 else palette[i % len(palette)])
+            ), row=row, col=col)
+
+        fig.update_yaxes(
+            title_text=trace_name if view != "yoy" else f"Δ {trace_name} vs previous year",
+            row=row,
+            col=col,
+            showgrid=True,
+            zeroline=True,
+            gridcolor='lightgray',
+            tickfont=dict(size=12, color='black'),
+            title_font=dict(size=12, color="black"),
+            range=[0, None] if view != "yoy" else None
+        )
+
+    add_trace(1, 1, "dengue_cases", "Dengue Cases (Monthly Sum)", "red")
+    add_trace(2, 1, "temperature_2m_max", "Max Temperature (°C) (Monthly Mean)", "orange")
+    add_trace(3, 1, "temperature_2m_min", "Min Temperature (°C) (Monthly Mean)", "blue")
+    add_trace(4, 1, "relative_humidity_2m_mean", "Mean Relative Humidity (%) (Monthly Mean)", "green")
+    add_trace(5, 1, "rain_sum", "Rainfall (mm) (Monthly Sum)", "purple")
+
+    for i in range(1, 6):
+        if view == "climatology":
+            fig.update_xaxes(row=i, col=1, type="category", tickfont=dict(size=10, color='black'),
+                             ticks="outside", showgrid=True, gridcolor='lightgray')
+            continue
+        fig.update_xaxes(
+            row=i, col=1,
+            type="date",  # x values are epoch milliseconds
+            tickangle=-45,
+            tickmode="linear",
+            tickfont=dict(size=10, color='black'),
+            ticks="outside",
+            showgrid=True,
+            gridcolor='lightgray',
+            range=[x_start, x_end],
+            tick0=x_start,
+            **axis_ticks(x_start, x_end)  # monthly ticks, coarser as the history grows
+        )
+
+
+    # --- Layout ---
+    fig.update_layout(
+        height=2100,
+        width=3000,
+        title_text=f"Monthly Dengue and Climate Trends (2022-2024) — {view_label} — District: {', '.join(selected)}",
+        showlegend=len(selected) > 1,
+        margin=dict(t=80, b=100),
+        template=None,
+        plot_bgcolor="white",
+        paper_bgcolor="white",
+        font=dict(color='black')
     )
 
-add_trace(1, 1, "dengue_cases", "Dengue Cases (Monthly Sum)", "red")
-add_trace(2, 1, "temperature_2m_max", "Max Temperature (°C) (Monthly Mean)", "orange")
-add_trace(3, 1, "temperature_2m_min", "Min Temperature (°C) (Monthly Mean)", "blue")
-add_trace(4, 1, "relative_humidity_2m_mean", "Mean Relative Humidity (%) (Monthly Mean)", "green")
-add_trace(5, 1, "rain_sum", "Rainfall (mm) (Monthly Sum)", "purple")
-
-for i in range(1, 6):
+    if view == "climatology":
+        return fig
     fig.update_xaxes(
-        row=i, col=1,
         tickangle=-45,
-        tickformat="%b\n%Y",
-        tickmode="linear",
-        dtick="M1",  # Show  month
         tickfont=dict(size=10, color='black'),
         ticks="outside",
         showgrid=True,
-        gridcolor='lightgray',
-        range=[x_start, x_end],
-        tick0=filtered["Year_Month"].iloc[0]
+        gridcolor='lightgray'
     )
 
+    return fig
+
 
-# --- Layout ---
-fig.update_layout(
-    height=2100,
-    width=3000,
-    title_text=f"Monthly Dengue and Climate Trends (2022-2024) — District: {selected_dt}",
-    showlegend=False,
-    margin=dict(t=80, b=100),
-    template=None,
-    plot_bgcolor="white",
-    paper_bgcolor="white",
-    font=dict(color='black')
-)
-
-fig.update_xaxes(
-    tickangle=-45,
-    tickformat="%b %Y",
-    tickfont=dict(size=10, color='black'),
-    ticks="outside",
-    showgrid=True,
-    gridcolor='lightgray'
-)
+fig = cached_figure("monthly", ",".join(selected), None, version, build_monthly_figure, params=(view, render_mode))
 
 # --- Display Chart ---
-st.plotly_chart(fig, use_container_width=True)
+with stage("plotly_chart"):
+    st.plotly_chart(fig, use_container_width=True)
 
-st.markdown("""
+st.markdown(f"""
 **Note:** Districts suffixed with 'High' report the highest cases from 2022-2024.
+Year-over-year change is each month minus the same month one year earlier; climatology is the mean of each calendar month over {CLIMATOLOGY_YEARS[0]}-{CLIMATOLOGY_YEARS[1]}.
 """)
 
+debug_panel()
@@ -1,123 +1,114 @@
 
+import math
+import numpy as np
 import streamlit as st
-import pandas as pd
-import os
-from datetime import timedelta
 from plotly import graph_objects as go
-from utils import load_drive, get_sorted_subdistricts
-from itertools import groupby
-from operator import itemgetter
+from plotly.subplots import make_subplots
+from instrument import cache_resource, begin_run, stage, debug_panel
+from warmup import start_warmup
+from data_store import load_weekly_data, load_weekly_index, select_block, weekly_data_version
+from charts import cached_figure, render_mode_sidebar, use_webgl, line_trace, subplot_refs
+from utils import epoch_ms
+from analysis import (threshold_sidebar, mask_bounds, block_highlight_ranges,
+                      block_breeding_summary, breeding_summary_text)
+from ranking import ranking_sidebar, top_ranked, load_window_totals
 
 st.set_page_config(page_title="Top Blocks - Weekly Time Series (Jul-Dec 2024)", layout="wide")
-
-# --- Load data from Google Drive only if not already downloaded ---
-csv_path = "time_series_dashboard.csv"
-file_id = "1ad-PcGSpk6YoO-ZolodMWfvFq64kO-Z_"
-
-if not os.path.exists(csv_path):
-    drive = load_drive(st.secrets["gdrive_creds"])
-    downloaded = drive.CreateFile({'id': file_id})
-    downloaded.GetContentFile(csv_path)
-
-# --- Load and clean data ---
-@st.cache_data
-def load_weekly_data():
-    df = pd.read_csv(csv_path, parse_dates=["week_start_date"])
-    df = df[df["sdtname_disp"].str.contains("High")]
-    for col in ["dtname", "sdtname", "dtname_disp", "sdtname_disp"]:
-        df[col] = df[col].astype(str).str.strip()
-    return df
-
-df = load_weekly_data()
-
-# --- Sidebar filters ---
-subdistricts = [s for s in get_sorted_subdistricts(df) if s.lower() != "all"]
-selected_sdt = st.sidebar.selectbox("Select Block", subdistricts)
-
-# --- Filter for selected block ---
-block_df = df[df["sdtname_disp"] == selected_sdt].sort_values("week_start_date")
-
-if block_df.empty:
+begin_run("top_blocks")
+start_warmup()
+
+# --- Load data (shared, memory-mapped copy of the current dataset version) ---
+with stage("load"):
+    version = weekly_data_version()
+    df = load_weekly_data(version)
+    index = load_weekly_index(version)
+
+# --- Sidebar filters: blocks ranked by dengue cases over the chosen window ---
+ranking = ranking_sidebar()
+with stage("ranking"):
+    top = top_ranked(version, "blocks", ranking)
+if top.empty:
     st.warning("No data available for this selection.")
     st.stop()
 
-# --- Thresholds ---
-min_temp_threshold = 18
-max_temp_threshold = 35
-min_rh = 60
-max_rh = 80
-min_rainfall = 0.5
-max_rainfall = 150
-
-def get_highlight_ranges(df, date_col, condition_series):
-    # Extract dates where condition is True
-    dates = df.loc[condition_series, date_col].sort_values().tolist()
-    if not dates:
-        return []
-
-    # Group consecutive dates (assuming weekly data: consecutive means 7 days apart)
-    ranges = []
-    group = []
-    prev_date = None
-
-    for d in dates:
-        if prev_date is None or (d - prev_date).days == 7:
-            group.append(d)
-        else:
-            ranges.append((group[0], group[-1]))
-            group = [d]
-        prev_date = d
-    if group:
-        ranges.append((group[0], group[-1]))
-
-    # Expand each range by 6 days to cover full week (start to end +6)
-    expanded_ranges = [(start, end + timedelta(days=6)) for start, end in ranges]
-    return expanded_ranges
-
-
-def plot_temperature(df):
-    fig = go.Figure()
-    fig.add_bar(
-        x=df["week_start_date"], y=df["dengue_cases"],
+labels = [f"{r.rank}. {r.sdtname} ({r.dtname})" for r in top.itertuples()]
+grid_view = st.sidebar.radio("View", ["Single block", "Grid"], horizontal=True, key="top_blocks_view") == "Grid"
+choice = 0 if grid_view else st.sidebar.selectbox("Select Block", range(len(top)), format_func=labels.__getitem__)
+thresholds = threshold_sidebar()
+render_mode = render_mode_sidebar()
+
+selected = top.iloc[choice]
+block_key = (selected["dtname_disp"], selected["sdtname_disp"])
+
+# --- Filter for selected block (index lookup; rows already sorted by week) ---
+with stage("filter"):
+    block_df = select_block(df, index, *block_key)
+
+
+def highlight_ranges(mask_name):
+    return block_highlight_ranges(version, index, block_key, mask_name, thresholds)
+
+# --- Highlight bands: one rectangle per run of qualifying weeks ---
+# x spans the run (first week start to last week end), y spans the threshold
+# band on the secondary axis. Returned as dicts so each figure sets all of its
+# shapes in one layout update.
+def highlight_bands(ranges, y0, y1, color, xref="x", yref="y2"):
+    return [
+        dict(type="rect", xref=xref, yref=yref, x0=start, x1=end, y0=y0, y1=y1,
+             fillcolor=color, opacity=0.15, line_width=0, layer="below")
+        for start, end in ranges
+    ]
+
+
+# --- Chart specs: one dual-axis chart (dengue bars + climate lines) per tab ---
+CHART_SPECS = {
+    "Temperature": dict(
+        title="Temperature and Dengue Cases",
+        y2_title="Temperature (°C)",
+        lines=[("temperature_2m_max", "Max Temp", "orange"),
+               ("temperature_2m_mean", "Mean Temp", "darkorange"),
+               ("temperature_2m_min", "Min Temp", "blue")],
+        # Highlight weeks where max temp is between the min and max temperature
+        mask="temp_band",
+        band=("min_temp", "max_temp"),
+        color="orange",
+    ),
+    "Rainfall": dict(
+        title="Rainfall and Dengue Cases",
+        y2_title="Rainfall (mm)",
+        lines=[("rain_sum", "Rainfall (mm)", "purple")],
+        mask="rainfall",
+        band=("min_rainfall", "max_rainfall"),
+        color="purple",
+    ),
+    "Humidity": dict(
+        title="Humidity and Dengue Cases",
+        y2_title="Humidity (%)",
+        lines=[("relative_humidity_2m_mean", "Humidity (%)", "green")],
+        mask="hum",
+        band=("min_rh", "max_rh"),
+        color="green",
+    ),
+}
+
+
+# --- Pieces shared by every tab of a block: x ticks, base layout, dengue bars ---
+@cache_resource(max_entries=32, show_spinner=False)
+def load_chart_base(block_key, version, _df):
+    weeks = _df["week_start_date"]
+    x_ms = epoch_ms(weeks)
+    bar = dict(
+        type="bar", x=x_ms, y=_df["dengue_cases"],
         name="Dengue Cases", marker_color="crimson", yaxis="y1"
     )
-    fig.add_trace(go.Scatter(
-        x=df["week_start_date"], y=df["temperature_2m_max"],
-        name="Max Temp", mode="lines+markers", line=dict(color="orange"), yaxis="y2"
-    ))
-    fig.add_trace(go.Scatter(
-        x=df["week_start_date"], y=df["temperature_2m_mean"],
-        name="Mean Temp", mode="lines+markers", line=dict(color="darkorange"), yaxis="y2"
-    ))
-    fig.add_trace(go.Scatter(
-        x=df["week_start_date"], y=df["temperature_2m_min"],
-        name="Min Temp", mode="lines+markers", line=dict(color="blue"), yaxis="y2"
-    ))
-
-    # Highlight weeks where max temp between 18 and 35
-    highlight_condition = (df["temperature_2m_max"] >= min_temp_threshold) & (df["temperature_2m_max"] <= max_temp_threshold)
-    highlight_ranges = get_highlight_ranges(df, "week_start_date", highlight_condition)
-    for start, end in highlight_ranges:
-        # Add horizontal highlight band on y-axis 2 for temperature range
-        fig.add_hrect(
-            y0=min_temp_threshold, y1=max_temp_threshold,
-            fillcolor="orange",
-            opacity=0.15,
-            line_width=0,
-            layer="below",
-            yref="y2"
-        )
-        
-    x_ticks = df["week_start_date"].dt.strftime("%Y-%m-%d").tolist()
-
-    fig.update_layout(
-        title=dict(text="Temperature and Dengue Cases", font=dict(color="black", size=16), x=0.4),
+    layout = dict(
         xaxis=dict(
             title=dict(text="Week", font=dict(size=12, color='black')),
+            type="date",
             tickangle=-45,
             tickfont=dict(size=11, color='black'),
-            tickvals=df["week_start_date"],
-            ticktext=x_ticks,
+            tickvals=x_ms,
+            ticktext=weeks.dt.strftime("%Y-%m-%d").tolist(),
             showgrid=True,
             gridcolor='lightgray',
             zeroline=True
@@ -129,13 +120,6 @@ def plot_temperature(df):
             gridcolor='lightgray',
             zeroline=True
         ),
-        yaxis2=dict(
-            title=dict(text="Temperature (°C)", font=dict(size=12, color='black')),
-            overlaying="y",
-            side="right",
-            tickfont=dict(size=11, color='black'),
-            showgrid=False
-        ),
         legend=dict(
             orientation="h", y=-0.3, x=0.5, xanchor="center",
             font=dict(size=12, color='black')
@@ -144,145 +128,156 @@ def plot_temperature(df):
         plot_bgcolor="white",
         paper_bgcolor="white"
     )
-    return fig
+    return {"x": x_ms, "bar": bar, "layout": layout}
 
 
-def plot_rainfall(df):
-    fig = go.Figure()
-    fig.add_bar(
-        x=df["week_start_date"], y=df["dengue_cases"],
-        name="Dengue Cases", marker_color="crimson", yaxis="y1"
-    )
-    fig.add_trace(go.Scatter(
-        x=df["week_start_date"], y=df["rain_sum"],
-        name="Rainfall (mm)", mode="lines+markers", line=dict(color="purple"), yaxis="y2"
-    ))
-
-    # Highlight rainfall between thresholds
-    highlight_condition = (df["rain_sum"] >= min_rainfall) & (df["rain_sum"] <= max_rainfall)
-    highlight_ranges = get_highlight_ranges(df, "week_start_date", highlight_condition)
-    for start, end in highlight_ranges:
-        fig.add_hrect(
-        y0=min_rainfall, y1=max_rainfall,
-        fillcolor="purple",
-        opacity=0.15,
-        line_width=0,
-        layer="below",
-        yref="y2")
-
-
-    x_ticks = df["week_start_date"].dt.strftime("%Y-%m-%d").tolist()
+def plot_dual_axis(df, spec, base):
+    fig = go.Figure(data=[base["bar"]], layout=base["layout"])
+    webgl = use_webgl(render_mode, len(base["x"]) * len(spec["lines"]))
+    for col, name, color in spec["lines"]:
+        fig.add_trace(line_trace(
+            webgl,
+            x=base["x"], y=df[col],
+            name=name, mode="lines+markers", line=dict(color=color), yaxis="y2"
+        ))
+
+    y0, y1 = (thresholds[k] for k in spec["band"])
 
     fig.update_layout(
-        title=dict(text="Rainfall and Dengue Cases", font=dict(color="black", size=16), x=0.4),
-        xaxis=dict(
-            title=dict(text="Week", font=dict(size=12, color='black')),
-            tickangle=-45,
-            tickfont=dict(size=11, color='black'),
-            tickvals=df["week_start_date"],
-            ticktext=x_ticks,
-            showgrid=True,
-            gridcolor='lightgray',
-            zeroline=True
-        ),
-        yaxis=dict(
-            title=dict(text="Dengue Cases", font=dict(size=12, color='black')),
-            tickfont=dict(size=11, color='black'),
-            showgrid=True,
-            gridcolor='lightgray',
-            zeroline=True
-        ),
+        shapes=highlight_bands(highlight_ranges(spec["mask"]), y0, y1, spec["color"]),
+        title=dict(text=spec["title"], font=dict(color="black", size=16), x=0.4),
         yaxis2=dict(
-            title=dict(text="Rainfall (mm)", font=dict(size=12, color='black')),
+            title=dict(text=spec["y2_title"], font=dict(size=12, color='black')),
             overlaying="y",
             side="right",
             tickfont=dict(size=11, color='black'),
             showgrid=False
-        ),
-        legend=dict(
-            orientation="h", y=-0.3, x=0.5, xanchor="center",
-            font=dict(size=12, color='black')
-        ),
-        height=500,
-        plot_bgcolor="white",
-        paper_bgcolor="white"
+        )
     )
     return fig
 
 
-def plot_humidity(df):
-    fig = go.Figure()
-    fig.add_bar(
-        x=df["week_start_date"], y=df["dengue_cases"],
-        name="Dengue Cases", marker_color="crimson", yaxis="y1"
+# --- Grid view: every ranked block as small multiples in one figure ---
+# All panels come from one gather over the index slices of the ranked blocks
+# (the frame is already grouped by block), cached per version and ranking.
+GRID_COLS = 3
+GRID_PAGE_SIZE = 36  # 12 rows; the default ranking (10% of ~350 blocks) fits on one page
+GRID_COLUMNS = ["dengue_cases", "temperature_2m_max", "temperature_2m_mean", "temperature_2m_min",
+                "rain_sum", "relative_humidity_2m_mean"]
+
+
+@cache_resource(max_entries=8, show_spinner=False)
+def load_grid_data(version, keys):
+    slices = [index["blocks"][key] for key in keys]
+    rows = np.concatenate([np.arange(sl.start, sl.stop) for sl in slices])
+    lengths = np.array([sl.stop - sl.start for sl in slices])
+    columns = [c for c in GRID_COLUMNS if c in df.columns]
+    return {
+        "offsets": np.r_[0, np.cumsum(lengths)],
+        "x": epoch_ms(df["week_start_date"].to_numpy()[rows]),
+        "values": {col: df[col].to_numpy(dtype=float)[rows] for col in columns},
+    }
+
+
+def plot_grid(panels, spec, n_ranked):
+    keys = list(zip(panels["dtname_disp"], panels["sdtname_disp"]))
+    data = load_grid_data(version, tuple(keys))
+    n_rows = math.ceil(len(keys) / GRID_COLS)
+    fig = make_subplots(
+        rows=n_rows, cols=GRID_COLS, shared_xaxes=True,
+        vertical_spacing=min(0.08, 0.3 / n_rows), horizontal_spacing=0.06,
+        subplot_titles=[f"{r.rank}. {r.sdtname} ({r.dtname})" for r in panels.itertuples()],
+        specs=[[{"secondary_y": True}] * GRID_COLS for _ in range(n_rows)]
     )
-    fig.add_trace(go.Scatter(
-        x=df["week_start_date"], y=df["relative_humidity_2m_mean"],
-        name="Humidity (%)", mode="lines+markers", line=dict(color="green"), yaxis="y2"
-    ))
-
-    # Highlight humidity between thresholds
-    highlight_condition = (df["relative_humidity_2m_mean"] >= min_rh) & (df["relative_humidity_2m_mean"] <= max_rh)
-    highlight_ranges = get_highlight_ranges(df, "week_start_date", highlight_condition)
-    for start, end in highlight_ranges:
-        fig.add_hrect(
-            y0=min_rh, y1=max_rh,
-            fillcolor="green",
-            opacity=0.15,
-            line_width=0,
-            layer="below",
-            yref="y2")
-
-
-    x_ticks = df["week_start_date"].dt.strftime("%Y-%m-%d").tolist()
-
+    webgl = use_webgl(render_mode, len(data["x"]) * len(spec["lines"]))
+    y0, y1 = (thresholds[k] for k in spec["band"])
+    if len(panels) == n_ranked:
+        scope = f"top {n_ranked} blocks"
+    else:
+        scope = f"ranks {panels['rank'].iloc[0]}-{panels['rank'].iloc[-1]} of {n_ranked}"
+
+    shapes = []
+    for i, key in enumerate(keys):
+        row, col = divmod(i, GRID_COLS)
+        lo, hi = data["offsets"][i], data["offsets"][i + 1]
+        x = data["x"][lo:hi]
+        fig.add_trace(go.Bar(x=x, y=data["values"]["dengue_cases"][lo:hi], name="Dengue Cases",
+                             marker_color="crimson", showlegend=i == 0, legendgroup="cases"),
+                      row=row + 1, col=col + 1, secondary_y=False)
+        for line_col, name, color in spec["lines"]:
+            fig.add_trace(line_trace(webgl, x=x, y=data["values"][line_col][lo:hi], name=name, mode="lines",
+                                     line=dict(color=color, width=1.5), showlegend=i == 0, legendgroup=name),
+                          row=row + 1, col=col + 1, secondary_y=True)
+
+        xref, yref = subplot_refs(fig, row + 1, col + 1, secondary_y=True)
+        ranges = block_highlight_ranges(version, index, key, spec["mask"], thresholds)
+        shapes += highlight_bands(ranges, y0, y1, spec["color"], xref=xref, yref=yref)
+
+    # One set of layout objects for every panel
     fig.update_layout(
-        title=dict(text="Humidity and Dengue Cases", font=dict(color="black", size=16), x=0.4),
-        xaxis=dict(
-            title=dict(text="Week", font=dict(size=12, color='black')),
-            tickangle=-45,
-            tickfont=dict(size=11, color='black'),
-            tickvals=df["week_start_date"],
-            ticktext=x_ticks,
-            showgrid=True,
-            gridcolor='lightgray',
-            zeroline=True
-        ),
-        yaxis=dict(
-            title=dict(text="Dengue Cases", font=dict(size=12, color='black')),
-            tickfont=dict(size=11, color='black'),
-            showgrid=True,
-            gridcolor='lightgray',
-            zeroline=True
-        ),
-        yaxis2=dict(
-            title=dict(text="Humidity (%)", font=dict(size=12, color='black')),
-            overlaying="y",
-            side="right",
-            tickfont=dict(size=11, color='black'),
-            showgrid=False
-        ),
-        legend=dict(
-            orientation="h", y=-0.3, x=0.5, xanchor="center",
-            font=dict(size=12, color='black')
-        ),
-        height=500,
+        shapes=shapes,
+        height=260 * n_rows + 120,
+        title=dict(text=f"{spec['title']} — {scope}", font=dict(color="black", size=16), x=0.4),
+        legend=dict(orientation="h", y=1.0, x=0.5, xanchor="center", yanchor="bottom",
+                    font=dict(size=12, color='black')),
+        margin=dict(t=120),
         plot_bgcolor="white",
-        paper_bgcolor="white"
+        paper_bgcolor="white",
+        bargap=0.1
     )
+    fig.update_xaxes(type="date", tickformat="%b %y", tickfont=dict(size=10, color='black'),
+                     showgrid=True, gridcolor='lightgray')
+    fig.update_yaxes(tickfont=dict(size=10, color='black'), showgrid=True, gridcolor='lightgray',
+                     secondary_y=False)
+    fig.update_yaxes(tickfont=dict(size=10, color='black'), showgrid=False, secondary_y=True)
+    fig.update_annotations(font_size=12)
     return fig
 
 
 st.title("Dengue and Climate Conditions")
-st.markdown(f"### {selected_sdt}")
-
-tab1, tab2, tab3 = st.tabs(["Temperature", "Rainfall", "Humidity"])
-
-with tab1:
-    st.plotly_chart(plot_temperature(block_df), use_container_width=True)
-
-with tab2:
-    st.plotly_chart(plot_rainfall(block_df), use_container_width=True)
-
-with tab3:
-    st.plotly_chart(plot_humidity(block_df), use_container_width=True)
+start, end = load_window_totals(version, ranking["weeks"])[1]
+n_pages = -(-len(top) // GRID_PAGE_SIZE)
+grid_page = 0
+if grid_view and n_pages > 1:
+    grid_page = st.sidebar.selectbox(
+        "Grid page", range(n_pages),
+        format_func=lambda p: f"Blocks {p * GRID_PAGE_SIZE + 1}-{min((p + 1) * GRID_PAGE_SIZE, len(top))}"
+    )
+panels = top.iloc[grid_page * GRID_PAGE_SIZE:(grid_page + 1) * GRID_PAGE_SIZE]
+if grid_view:
+    st.markdown(f"### Top {len(top)} blocks by dengue cases ({start:%d-%b-%y} to {end:%d-%b-%y})")
+    if n_pages > 1:
+        st.caption(f"Showing ranks {panels['rank'].iloc[0]}-{panels['rank'].iloc[-1]} of {len(top)}, "
+                   f"page {grid_page + 1} of {n_pages}.")
+else:
+    st.markdown(f"### {selected['sdtname']} ({selected['dtname']})")
+    st.markdown(f"Rank **{selected['rank']}** of the top {len(top)} blocks by dengue cases "
+                f"({selected['cases']:,.0f} cases, {start:%d-%b-%y} to {end:%d-%b-%y}).")
+    st.markdown(breeding_summary_text(block_breeding_summary(version, index, block_key, thresholds)))
+
+with st.expander("Ranking table"):
+    st.dataframe(top[["rank", "dtname", "sdtname", "cases"]], hide_index=True, width="stretch")
+
+# --- Lazy tabs: only the open tab's chart is built and sent ---
+tabs = st.tabs(list(CHART_SPECS), key="top_blocks_tab", on_change="rerun")
+
+for tab, (name, spec) in zip(tabs, CHART_SPECS.items()):
+    if not tab.open:
+        continue
+    with tab:
+        if grid_view:
+            fig = cached_figure(
+                f"top_blocks_grid/{name.lower()}", None, tuple(panels["position"].tolist()), version,
+                lambda: plot_grid(panels, spec, len(top)),
+                params=(mask_bounds(spec["mask"], thresholds), render_mode, len(top))
+            )
+        else:
+            fig = cached_figure(
+                f"top_blocks/{name.lower()}", block_key[0], block_key[1], version,
+                lambda: plot_dual_axis(block_df, spec, load_chart_base(block_key, version, block_df)),
+                params=(mask_bounds(spec["mask"], thresholds), render_mode)
+            )
+        with stage("plotly_chart"):
+            st.plotly_chart(fig, use_container_width=True)
+
+debug_panel()
@@ -1,32 +1,142 @@
 import streamlit as st
-import os
-from utils import load_drive
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from data_store import BOUNDARY_GEOJSON, boundary_version, ensure_downloaded, load_weekly_options, weekly_data_version
+from charts import cached_figure
+from analysis import threshold_sidebar, mask_bounds
+from geometry import load_block_geojson, load_map_arrays
+from instrument import begin_run, stage, debug_panel
+from warmup import start_warmup
 
 st.set_page_config(page_title="Breeding Conditions", layout="wide")
+begin_run("breeding_map")
+start_warmup()
 
-gif_path = "breeding_conditions_cases.gif"
-gif_file_id = "1q5xMFHqlDcokgHX8cumuIRQ4NxPaFmTc"  # ID from shared Google Drive link
+# --- Load data (current dataset version) ---
+with stage("load"):
+    version = weekly_data_version()
+    options = load_weekly_options(version)
 
-# --- Download GIF from Google Drive if not already downloaded ---
-if not os.path.exists(gif_path):
-    drive = load_drive(st.secrets["gdrive_creds"])
-    gif_file = drive.CreateFile({'id': gif_file_id})
-    gif_file.GetContentFile(gif_path)
+# --- Sidebar filters ---
+selected_dt = st.sidebar.selectbox("Select District", options["districts"])
+thresholds = threshold_sidebar()
+bounds = mask_bounds("all", thresholds)
 
-# --- Title and Image Display ---
 st.title("Breeding Conditions & Dengue Cases (2024)")
 
-if os.path.exists(gif_path):
-    with open(gif_path, "rb") as f:
-        img_bytes = f.read()
-    st.image(img_bytes)  # ✅ Removed `format="GIF"`
+with stage("map_arrays"):
+    arrays = load_map_arrays(version, bounds)
+in_district = arrays["is_block"] & (arrays["dtname_disp"] == selected_dt)
+
+# --- Geometry: simplified once per zoom level and cut to the selected
+# district, so a district view only ships that district's polygons ---
+if selected_dt == "All":
+    zoom, district = "state", None
 else:
-    st.error("GIF file not found or could not be loaded.")
+    zoom, district = "district", arrays["dtname"][in_district][0] if in_district.any() else ""
+with stage("geometry"):
+    geo_version = boundary_version()
+    geo = None if geo_version is None else load_block_geojson(geo_version, zoom, district)
+if geo is None:
+    # No boundary file provisioned yet: fall back to the pre-rendered GIF
+    try:
+        gif_path = ensure_downloaded("gif")
+    except FileNotFoundError:
+        st.error(f"Block boundary file not found ({BOUNDARY_GEOJSON}) and no breeding-conditions GIF available.")
+        st.stop()
+    st.image(gif_path)
+    debug_panel()
+    st.stop()
+
+has_geometry = np.array([loc in geo["centroids"] for loc in arrays["locations"]])
+selected = (arrays["is_block"] if selected_dt == "All" else in_district) & has_geometry
+cols = np.flatnonzero(selected)
+if len(cols) == 0:
+    st.warning("No mapped blocks for this selection.")
+    st.stop()
+
+
+# --- Map figure ---
+# The geometry goes out once in the base traces; each week is an animation
+# frame carrying only the flag and case arrays, so scrubbing, play and pause
+# all happen in the browser.
+def build_map_figure():
+    locations = arrays["locations"][cols].tolist()
+    lon, lat = zip(*(geo["centroids"][loc] for loc in locations))
+    names = arrays["sdtname_disp"][cols].tolist()
+    flags = arrays["flags"][:, cols]
+    cases = arrays["cases"][:, cols]
+    sizeref = max(float(cases.max()), 1.0)
+    week_labels = pd.to_datetime(arrays["weeks"]).strftime("%d-%b-%y").tolist()
+
+    def bubble_sizes(week_cases):
+        return (4 + 26 * np.sqrt(week_cases / sizeref)).round(1)
+
+    fig = go.Figure(
+        data=[
+            go.Choropleth(
+                geojson=geo["geojson"], featureidkey="properties.block_key",
+                locations=locations, z=flags[0], zmin=0, zmax=1,
+                colorscale=[[0, "#f2f2f2"], [1, "#74c476"]], showscale=False,
+                marker_line_width=0.4, marker_line_color="gray",
+                hovertext=names, hoverinfo="text"
+            ),
+            go.Scattergeo(
+                lon=lon, lat=lat, mode="markers",
+                marker=dict(size=bubble_sizes(cases[0]), color="crimson", opacity=0.6, line_width=0),
+                customdata=cases[0], text=names,
+                hovertemplate="%{text}<br>Dengue cases: %{customdata}<extra></extra>"
+            ),
+        ],
+        frames=[
+            go.Frame(
+                name=label,
+                traces=[0, 1],
+                data=[
+                    go.Choropleth(z=flags[i]),
+                    go.Scattergeo(marker=dict(size=bubble_sizes(cases[i])), customdata=cases[i]),
+                ],
+            )
+            for i, label in enumerate(week_labels)
+        ],
+    )
+
+    frame_args = dict(mode="immediate", frame=dict(duration=600, redraw=True), transition=dict(duration=0))
+    fig.update_layout(
+        height=800,
+        margin=dict(t=20, b=20, l=0, r=0),
+        showlegend=False,
+        paper_bgcolor="white",
+        updatemenus=[dict(
+            type="buttons", direction="left", x=0.05, y=0, xanchor="right", yanchor="top",
+            buttons=[
+                dict(label="▶", method="animate", args=[None, dict(frame_args, fromcurrent=True)]),
+                dict(label="❚❚", method="animate", args=[[None], dict(frame_args, mode="immediate")]),
+            ],
+        )],
+        sliders=[dict(
+            x=0.05, y=0, len=0.95, yanchor="top",
+            currentvalue=dict(prefix="Week of "),
+            steps=[dict(label=label, method="animate", args=[[label], frame_args]) for label in week_labels],
+        )],
+    )
+    fig.update_geos(fitbounds="locations", visible=False)
+    return fig
+
+
+# The figure embeds the polygons, so the boundary version is part of its key
+fig = cached_figure("breeding_map", selected_dt, None, version, build_map_figure, params=(bounds, geo_version))
+with stage("plotly_chart"):
+    st.plotly_chart(fig, use_container_width=True)
+
 # Markdown notes / comments section
-st.markdown("""
+st.markdown(f"""
 ---
 ### Notes:
-- The green shading indicates areas meeting breeding condition thresholds: Mean Max Temp ≤ 35°C AND Min Temp ≥ 18°C OR RH 60–80%.
+- The green shading indicates blocks meeting breeding condition thresholds in the selected week: Mean Max Temp ≤ {thresholds['max_temp']:g}°C AND Min Temp ≥ {thresholds['min_temp']:g}°C OR RH {thresholds['min_rh']:g}–{thresholds['max_rh']:g}%.
 - Bubble sizes represent the number of dengue cases.
-- Reload the page to view the GIF again.
+- Use the play/pause buttons or drag the week slider to move through the season.
 """)
+
+debug_panel()
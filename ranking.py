@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+from instrument import cache_resource
+from analysis import load_block_layout
+from data_store import load_weekly_data
+
+# --- Ranking windows: trailing weeks up to the latest week in the data ---
+RANK_WINDOWS = {"Whole season": None, "Last 4 weeks": 4, "Last 8 weeks": 8, "Last 12 weeks": 12}
+DEFAULT_PERCENTILE = 10
+DEFAULT_TOP_K = 20
+
+
+# --- Top-k by value: argpartition, then order only the k winners ---
+# Ties keep the frame's (district, block) order.
+def top_k(values, k):
+    k = min(k, len(values))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    picks = np.argpartition(-values, k - 1)[:k]
+    return picks[np.lexsort((picks, -values[picks]))]
+
+
+def k_for_percentile(n, percentile):
+    return max(1, int(np.ceil(n * percentile / 100)))
+
+
+# --- Entities to rank, as positions in the weekly index ---
+# Blocks are real (district, block) rows; districts are each district's "All"
+# row. Raw names come from dtname/sdtname, without the offline "High" tags.
+@cache_resource(max_entries=2, show_spinner=False)
+def load_rank_entities(version):
+    df = load_weekly_data(version)
+    layout = load_block_layout(version)
+    dt_disp = np.array([k[0] for k in layout["keys"]], dtype=object)
+    sdt_disp = np.array([k[1] for k in layout["keys"]], dtype=object)
+    starts = layout["starts"]
+    return {
+        "blocks": np.flatnonzero((dt_disp != "All") & (sdt_disp != "All")),
+        "districts": np.flatnonzero((dt_disp != "All") & (sdt_disp == "All")),
+        "dtname_disp": dt_disp,
+        "sdtname_disp": sdt_disp,
+        "dtname": df["dtname"].astype(str).to_numpy()[starts].astype(object),
+        "sdtname": df["sdtname"].astype(str).to_numpy()[starts].astype(object),
+    }
+
+
+# --- Grouped case totals per block over a trailing window (one bincount) ---
+def window_totals(df, layout, n_weeks):
+    weeks = df["week_start_date"].to_numpy()
+    cases = np.nan_to_num(df["dengue_cases"].to_numpy(dtype=float))
+    start = weeks.min()
+    if n_weeks is not None:
+        start = max(start, weeks.max() - np.timedelta64(7 * (n_weeks - 1), "D"))
+        cases = np.where(weeks >= start, cases, 0.0)
+    totals = np.bincount(layout["groups"], weights=cases, minlength=len(layout["keys"]))
+    return totals, (pd.Timestamp(start), pd.Timestamp(weeks.max()))
+
+
+@cache_resource(max_entries=8, show_spinner=False)
+def load_window_totals(version, n_weeks):
+    return window_totals(load_weekly_data(version), load_block_layout(version), n_weeks)
+
+
+# --- Top-k table per (window, k): rank is a plain integer column (1 = most cases) ---
+@cache_resource(max_entries=32, show_spinner=False)
+def load_top_ranked(version, level, n_weeks, k):
+    entities = load_rank_entities(version)
+    totals, _ = load_window_totals(version, n_weeks)
+    candidates = entities[level]
+    picks = candidates[top_k(totals[candidates], k)]
+    return pd.DataFrame({
+        "rank": np.arange(1, len(picks) + 1),
+        "dtname": entities["dtname"][picks],
+        "sdtname": entities["sdtname"][picks],
+        "cases": totals[picks],
+        "dtname_disp": entities["dtname_disp"][picks],
+        "sdtname_disp": entities["sdtname_disp"][picks],
+        "position": picks,
+    })
+
+
+def top_ranked(version, level, ranking):
+    n = len(load_rank_entities(version)[level])
+    k = ranking["k"] if ranking["by"] == "count" else k_for_percentile(n, ranking["percentile"])
+    return load_top_ranked(version, level, ranking["weeks"], k)
+
+
+# --- Sidebar ranking controls ---
+def ranking_sidebar():
+    with st.sidebar.expander("Ranking", expanded=True):
+        window = st.selectbox("Rank by dengue cases in", list(RANK_WINDOWS), key="rank_window")
+        by = st.radio("Top", ["Percentile", "Count"], horizontal=True, key="rank_by")
+        if by == "Count":
+            k = st.slider("Number of blocks", 1, 100, DEFAULT_TOP_K, key="rank_k")
+            return {"window": window, "weeks": RANK_WINDOWS[window], "by": "count", "k": k}
+        pct = st.slider("Top percentile (%)", 1, 50, DEFAULT_PERCENTILE, key="rank_pct")
+        return {"window": window, "weeks": RANK_WINDOWS[window], "by": "percentile", "percentile": pct}
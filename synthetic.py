@@ -0,0 +1,263 @@
+"""Synthetic dashboard datasets in the same schemas as the Drive files.
+
+Generates the weekly block table (time_series_dashboard.csv), the monthly
+district table (dist_ts_dashboard.csv) and a block boundary GeoJSON at any
+scale, for running the pages offline and for load/scale testing:
+
+    python synthetic.py data/ --blocks 350 --weeks 26
+    VBD_LOCAL_DATA=data/ streamlit run home.py
+
+or, to generate a default-sized dataset into an empty directory on first use:
+
+    VBD_LOCAL_DATA=data/ VBD_SYNTHETIC=1 streamlit run home.py
+
+Climate follows Rajasthan's seasons (pre-monsoon heat peaking in May, humid
+and wet Jul-Sep) and dengue surges about two months after the monsoon peak.
+Derived columns are computed with the dashboard's own rules: High labels for
+the top 10% of districts and blocks, trigger weeks and threshold lags from
+analysis.compute_triggers, and meets_threshold from the default thresholds.
+"""
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+
+DISTRICTS = [
+    "Ajmer", "Alwar", "Banswara", "Baran", "Barmer", "Bharatpur", "Bhilwara", "Bikaner",
+    "Bundi", "Chittorgarh", "Churu", "Dausa", "Dholpur", "Dungarpur", "Hanumangarh", "Jaipur",
+    "Jaisalmer", "Jalore", "Jhalawar", "Jhunjhunu", "Jodhpur", "Karauli", "Kota", "Nagaur",
+    "Pali", "Pratapgarh", "Rajsamand", "Sawai Madhopur", "Sikar", "Sirohi", "Sri Ganganagar",
+    "Tonk", "Udaipur",
+]
+BLOCKS_PER_DISTRICT = 10
+HIGH_SHARE = 0.10           # top 10% of districts / blocks by cases get a High label
+STATE_BOUNDS = (69.5, 23.0, 78.3, 30.2)  # lon/lat box for the synthetic boundaries
+
+
+def district_names(n):
+    return [DISTRICTS[i] if i < len(DISTRICTS) else f"District {i + 1}" for i in range(n)]
+
+
+# --- Seasonal shapes (day of year -> 0..1) ---
+def monsoon(doy):
+    return np.exp(-(((doy - 215) / 35) ** 2))  # peaks early August
+
+
+def dengue_season(doy):
+    return np.exp(-(((doy - 285) / 30) ** 2))  # peaks mid October
+
+
+# --- Per-block weekly series ---
+# Arrays are (blocks, weeks). Each block gets its own offsets (hotter/wetter,
+# higher burden) plus week-to-week noise; case counts are Poisson around a
+# burden-scaled seasonal curve with a year-to-year multiplier.
+def block_series(rng, n_blocks, dates):
+    doy = dates.dayofyear.to_numpy()[None, :]
+    wet = monsoon(doy)
+    heat = np.sin(2 * np.pi * (doy - 60) / 365.25)
+    shape = (n_blocks, len(dates))
+
+    tmax = 33 + 8 * heat - 5 * wet + rng.normal(0, 1.5, (n_blocks, 1)) + rng.normal(0, 1.2, shape)
+    tmin = tmax - (15 - 7 * wet) + rng.normal(0, 1.0, shape)
+    rh = 32 + 48 * wet + rng.normal(0, 5, (n_blocks, 1)) + rng.normal(0, 5, shape)
+    wetness = rng.lognormal(0, 0.4, (n_blocks, 1))
+    rain = rng.gamma(0.8, 2 + 70 * wet * wetness, shape)
+    rain[rng.random(shape) < 0.75 * (1 - wet)] = 0.0
+
+    years = dates.year.to_numpy()
+    year_factor = dict(zip(np.unique(years), rng.lognormal(0, 0.3, len(np.unique(years)))))
+    burden = rng.lognormal(0, 0.9, (n_blocks, 1))
+    rate = burden * (0.2 + 10 * dengue_season(doy)) * np.array([year_factor[y] for y in years])[None, :]
+    return {
+        "dengue_cases": rng.poisson(rate).astype(float),
+        "temperature_2m_max": tmax,
+        "temperature_2m_mean": (tmax + tmin) / 2,
+        "temperature_2m_min": tmin,
+        "relative_humidity_2m_mean": np.clip(rh, 5, 100),
+        "rain_sum": rain,
+    }
+
+
+def high_ranks(totals, share=HIGH_SHARE):
+    n_high = int(np.ceil(len(totals) * share))
+    order = np.argsort(-totals, kind="stable")[:n_high]
+    ranks = np.zeros(len(totals), dtype=int)
+    ranks[order] = np.arange(1, n_high + 1)
+    return ranks
+
+
+# --- Weekly block table ---
+# One row per (district, block, week), each district's "All" rows (case sums,
+# climate means over its blocks) and the statewide "All"/"All" rows.
+def generate_weekly(n_blocks=350, n_weeks=26, start="2024-07-01", seed=0):
+    from data_store import build_block_index
+    from analysis import compute_triggers, threshold_masks
+
+    rng = np.random.default_rng(seed)
+    n_districts = min(max(1, round(n_blocks / BLOCKS_PER_DISTRICT)), n_blocks)
+    dates = pd.date_range(start, periods=n_weeks, freq="7D")
+    series = block_series(rng, n_blocks, dates)
+
+    districts = district_names(n_districts)
+    block_district = np.arange(n_blocks) % n_districts
+    block_number = np.arange(n_blocks) // n_districts + 1
+    district_blocks = [np.flatnonzero(block_district == d) for d in range(n_districts)]
+
+    # Aggregate rows: districts, then the state
+    agg = {}
+    for col, values in series.items():
+        how = np.sum if col == "dengue_cases" else np.mean
+        per_district = np.stack([how(values[rows], axis=0) for rows in district_blocks])
+        agg[col] = np.vstack([per_district, how(values, axis=0, keepdims=True)])
+    with_cases = series["dengue_cases"].sum(axis=1) > 0
+    pct = [100 * with_cases[rows].mean() for rows in district_blocks]
+
+    # High labels from whole-period case totals
+    block_rank = high_ranks(series["dengue_cases"].sum(axis=1))
+    district_rank = high_ranks(agg["dengue_cases"][:n_districts].sum(axis=1))
+    has_high = np.zeros(n_districts, dtype=bool)
+    has_high[block_district[block_rank > 0]] = True
+
+    dt_disp = []
+    for d, name in enumerate(districts):
+        if district_rank[d]:
+            dt_disp.append(f"{name} (High District - {district_rank[d]})")
+        elif has_high[d]:
+            dt_disp.append(f"{name} (Has High Blocks)")
+        else:
+            dt_disp.append(name)
+
+    # Row keys in (district, block) order: district "All" first, then its blocks.
+    # sources[i] is key i's row in the stacked (aggregates, blocks) arrays.
+    keys, sources = [], []
+    for d, rows in enumerate(district_blocks):
+        keys.append((districts[d], "All", dt_disp[d], "All", pct[d]))
+        sources.append(d)
+        for b in rows:
+            sdt = f"{districts[d]} Block {block_number[b]}"
+            label = f"{sdt} (High Block - {block_rank[b]})" if block_rank[b] else sdt
+            keys.append((districts[d], sdt, dt_disp[d], label, pct[d]))
+            sources.append(n_districts + 1 + b)
+    keys.append(("All", "All", "All", "All", 100 * with_cases.mean()))
+    sources.append(n_districts)
+
+    df = pd.DataFrame({
+        "dtname": np.repeat([k[0] for k in keys], n_weeks),
+        "sdtname": np.repeat([k[1] for k in keys], n_weeks),
+        "dtname_disp": pd.Categorical(np.repeat([k[2] for k in keys], n_weeks)),
+        "sdtname_disp": pd.Categorical(np.repeat([k[3] for k in keys], n_weeks)),
+        "week_start_date": np.tile(dates.to_numpy(), len(keys)),
+    })
+    for col in series:
+        stacked = np.vstack([agg[col], series[col]])[sources]
+        df[col] = stacked.ravel().round(0 if col == "dengue_cases" else 2)
+    df["pct_blocks_with_cases"] = np.repeat([round(k[4], 1) for k in keys], n_weeks)
+
+    # Derived columns with the dashboard's default rules
+    df["meets_threshold"] = threshold_masks(df)["all"].astype(bool)
+    triggers = compute_triggers(df, build_block_index(df))
+    per_row = triggers.reindex(pd.MultiIndex.from_arrays([df["dtname_disp"], df["sdtname_disp"]]))
+    for col in triggers.columns:
+        df[col] = per_row[col].to_numpy()
+
+    df["dtname_disp"] = df["dtname_disp"].astype(str)
+    df["sdtname_disp"] = df["sdtname_disp"].astype(str)
+    df["week_start_date"] = df["week_start_date"].dt.strftime("%Y-%m-%d")
+    df["trigger_date"] = pd.to_datetime(df["trigger_date"]).dt.strftime("%Y-%m-%d")
+    return df
+
+
+# --- Monthly district table ---
+def generate_monthly(n_districts=33, n_months=36, start="2022-01", seed=0):
+    rng = np.random.default_rng(seed + 1)
+    months = pd.date_range(start, periods=n_months, freq="MS")
+    mid_month = months + pd.Timedelta(days=14)
+    series = block_series(rng, n_districts * BLOCKS_PER_DISTRICT, mid_month)
+
+    names = district_names(n_districts)
+    cases = series["dengue_cases"].reshape(n_districts, BLOCKS_PER_DISTRICT, -1).sum(axis=1) * 4
+    district_rank = high_ranks(cases.sum(axis=1))
+    disp = [f"{n} (High District - {r})" if r else n for n, r in zip(names, district_rank)]
+
+    def per_district(col):
+        return series[col].reshape(n_districts, BLOCKS_PER_DISTRICT, -1).mean(axis=1)
+
+    tables = {
+        "dengue_cases": cases,
+        "temperature_2m_max": per_district("temperature_2m_max"),
+        "temperature_2m_min": per_district("temperature_2m_min"),
+        "relative_humidity_2m_mean": per_district("relative_humidity_2m_mean"),
+        "rain_sum": per_district("rain_sum") * 4.35,
+    }
+    state = {col: (arr.sum(axis=0) if col == "dengue_cases" else arr.mean(axis=0)) for col, arr in tables.items()}
+
+    rows = len(names) + 1
+    df = pd.DataFrame({
+        "dtname": np.repeat(names + ["All"], n_months),
+        "dtname_disp": np.repeat(disp + ["All"], n_months),
+        "Year_Month": np.tile(months.strftime("%Y-%m"), rows),
+    })
+    for col, arr in tables.items():
+        df[col] = np.vstack([arr, state[col]]).ravel().round(0 if col == "dengue_cases" else 2)
+    return df
+
+
+# --- Block boundaries: one grid cell per block, tiled inside the state box ---
+def generate_boundaries(weekly):
+    blocks = weekly.loc[(weekly["dtname"] != "All") & (weekly["sdtname"] != "All"), ["dtname", "sdtname"]]
+    blocks = blocks.drop_duplicates().reset_index(drop=True)
+    cols = int(np.ceil(np.sqrt(len(blocks))))
+    rows = int(np.ceil(len(blocks) / cols))
+    west, south, east, north = STATE_BOUNDS
+    width, height = (east - west) / cols, (north - south) / rows
+
+    features = []
+    for i, block in blocks.iterrows():
+        x0 = west + (i % cols) * width
+        y0 = north - (i // cols + 1) * height
+        ring = [[x0, y0], [x0 + width, y0], [x0 + width, y0 + height], [x0, y0 + height], [x0, y0]]
+        features.append({
+            "type": "Feature",
+            "properties": {"dtname": block["dtname"], "sdtname": block["sdtname"]},
+            "geometry": {"type": "Polygon", "coordinates": [[[round(x, 5), round(y, 5)] for x, y in ring]]},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+# --- Write every dataset file the pages read, under their usual names ---
+def write_dataset(directory, n_blocks=350, n_weeks=26, start="2024-07-01", n_months=36, seed=0):
+    from data_store import WEEKLY_CSV, MONTHLY_CSV, BOUNDARY_GEOJSON
+
+    os.makedirs(directory, exist_ok=True)
+    weekly = generate_weekly(n_blocks, n_weeks, start, seed)
+    n_districts = weekly.loc[weekly["dtname"] != "All", "dtname"].nunique()
+    monthly = generate_monthly(n_districts, n_months, seed=seed)
+
+    paths = {
+        "weekly": os.path.join(directory, WEEKLY_CSV),
+        "monthly": os.path.join(directory, MONTHLY_CSV),
+        "boundaries": os.path.join(directory, BOUNDARY_GEOJSON),
+    }
+    weekly.to_csv(paths["weekly"], index=False)
+    monthly.to_csv(paths["monthly"], index=False)
+    with open(paths["boundaries"], "w") as f:
+        json.dump(generate_boundaries(weekly), f)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--blocks", type=int, default=350)
+    parser.add_argument("--weeks", type=int, default=26)
+    parser.add_argument("--start", default="2024-07-01", help="first week start date")
+    parser.add_argument("--months", type=int, default=36)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for name, path in write_dataset(args.directory, args.blocks, args.weeks, args.start, args.months, args.seed).items():
+        print(f"{name}: {path} ({os.path.getsize(path) / 2**20:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
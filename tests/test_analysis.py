@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from analysis import (DEFAULT_THRESHOLDS, LAG_VARIABLES, TRIGGER_NEXT_WEEKS, TRIGGER_PREV_WEEKS, TRIGGER_RISE,
+                      TRIGGER_SUSTAIN, block_bounds, block_ids, block_intervals, compute_triggers, mask_intervals,
+                      run_lengths, threshold_lags, threshold_masks)
+from data_store import build_block_index
+
+
+# --- Random weekly frame: blocks of uneven length (some only 1-3 weeks), gaps
+# in the weeks, case spikes, and climate values around the default thresholds ---
+def weekly_frame(seed, n_blocks=60):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for b in range(n_blocks):
+        n_weeks = int(rng.choice([1, 2, 3, 8, 20, 40]))
+        weeks = pd.date_range("2024-01-01", periods=n_weeks + 5, freq="7D")
+        weeks = weeks[np.sort(rng.choice(len(weeks), n_weeks, replace=False))]
+        base = rng.choice([0, 1, 5])
+        parts.append(pd.DataFrame({
+            "dtname_disp": f"D{b // 6}",
+            "sdtname_disp": f"B{b}",
+            "week_start_date": weeks,
+            "dengue_cases": rng.poisson(base, n_weeks) + rng.choice([0, 0, 0, 12], n_weeks),
+            "temperature_2m_max": rng.uniform(30, 40, n_weeks),
+            "temperature_2m_min": rng.uniform(14, 22, n_weeks),
+            "relative_humidity_2m_mean": rng.uniform(50, 90, n_weeks),
+            "rain_sum": rng.choice([0.0, 1.0, 200.0], n_weeks),
+        }))
+    df = pd.concat(parts, ignore_index=True)
+    df["dtname_disp"] = df["dtname_disp"].astype("category")
+    df["sdtname_disp"] = df["sdtname_disp"].astype("category")
+    return df
+
+
+def block_rows(df):
+    return {key: g for key, g in df.groupby(["dtname_disp", "sdtname_disp"], observed=True, sort=False)}
+
+
+# --- Naive per-block references ---
+def naive_trigger(cases):
+    for i in range(TRIGGER_PREV_WEEKS, len(cases) - TRIGGER_NEXT_WEEKS):
+        prev = cases[i - TRIGGER_PREV_WEEKS:i].mean()
+        nxt = cases[i + 1:i + 1 + TRIGGER_NEXT_WEEKS].mean()
+        if cases[i] > 0 and cases[i] >= (1 + TRIGGER_RISE) * prev and nxt >= (1 + TRIGGER_SUSTAIN) * prev:
+            return i
+    return None
+
+
+def naive_lag(mask, trigger):
+    if trigger is None:
+        return np.nan
+    lag, i = 0, trigger - 1
+    while i >= 0 and mask[i]:
+        lag, i = lag + 1, i - 1
+    return lag or np.nan
+
+
+def naive_intervals(mask, weeks):
+    runs = []
+    for i in np.flatnonzero(mask):
+        if runs and i - 1 == runs[-1][2] and weeks[i] - weeks[i - 1] == pd.Timedelta(weeks=1):
+            runs[-1][1:] = [weeks[i], i]
+        else:
+            runs.append([weeks[i], weeks[i], i])
+    return [(start, end + pd.Timedelta(days=6)) for start, end, _ in runs]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_compute_triggers_matches_per_block_loop(seed):
+    df = weekly_frame(seed)
+    result = compute_triggers(df, build_block_index(df))
+    masks = threshold_masks(df, DEFAULT_THRESHOLDS)
+
+    for key, g in block_rows(df).items():
+        trigger = naive_trigger(g["dengue_cases"].to_numpy(dtype=float))
+        row = result.loc[key]
+        if trigger is None:
+            assert pd.isna(row["trigger_date"]), key
+        else:
+            assert row["trigger_date"] == g["week_start_date"].iloc[trigger], key
+        for name in LAG_VARIABLES:
+            expected = naive_lag(masks[name][g.index], trigger)
+            actual = row[f"lag_{name}_weeks"]
+            assert (np.isnan(actual) and np.isnan(expected)) or actual == expected, (key, name)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_run_lengths_restart_at_block_starts(seed):
+    df = weekly_frame(seed)
+    _, starts, stops = block_bounds(build_block_index(df))
+    mask = threshold_masks(df)["all"]
+    runs = run_lengths(mask, starts)
+
+    for start, stop in zip(starts, stops):
+        run = 0
+        for i in range(start, stop):
+            run = run + 1 if mask[i] else 0
+            assert runs[i] == run, i
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_mask_intervals_match_per_block_runs(seed):
+    df = weekly_frame(seed)
+    keys, starts, stops = block_bounds(build_block_index(df))
+    weeks = df["week_start_date"].to_numpy()
+
+    for name, mask in threshold_masks(df).items():
+        intervals = mask_intervals(mask, block_ids(starts, stops), weeks, len(keys))
+        for position, (start, stop) in enumerate(zip(starts, stops)):
+            expected = naive_intervals(mask[start:stop], pd.to_datetime(weeks[start:stop]))
+            assert block_intervals(intervals, position) == expected, (name, keys[position])
+
+
+# A trigger on a block's first row has no weeks before it; the run that ends the
+# previous block must not leak into its lag
+def test_threshold_lags_do_not_cross_block_starts():
+    mask = np.array([True, True, True, True, False, True])
+    starts = np.array([0, 3])
+    triggers = np.array([2, 3])
+    lags = threshold_lags(mask, starts, triggers)
+    assert lags[0] == 2
+    assert np.isnan(lags[1])
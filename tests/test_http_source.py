@@ -0,0 +1,129 @@
+import functools
+import hashlib
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import fetcher
+from fetcher import dataset_version, download, ensure_file, manifest_for, read_manifest
+from utils import HttpSource
+
+ARTIFACT = {"name": "time_series_dashboard.csv", "file_id": None}
+
+
+# --- A local mirror: serves a directory, with the file's MD5 as ETag like S3 ---
+class MirrorHandler(SimpleHTTPRequestHandler):
+    requests = []
+    etag_override = None
+
+    def end_headers(self):
+        path = self.translate_path(self.path)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                etag = self.etag_override or hashlib.md5(f.read()).hexdigest()
+            self.send_header("ETag", f'"{etag}"')
+        super().end_headers()
+
+    def log_request(self, code="-", size="-"):
+        self.requests.append((self.command, self.path))
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    root = tmp_path / "mirror"
+    root.mkdir()
+    MirrorHandler.requests = []
+    MirrorHandler.etag_override = None
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(MirrorHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield root, HttpSource(f"http://127.0.0.1:{server.server_address[1]}/")
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    fetcher._manifest_cache.clear()
+    fetcher._unavailable.clear()
+    return str(cache / ARTIFACT["name"])
+
+
+def gets():
+    return [r for r in MirrorHandler.requests if r[0] == "GET"]
+
+
+def test_download_verifies_and_records_version(mirror, cache_path):
+    root, source = mirror
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n")
+
+    assert download(source, ARTIFACT, cache_path)
+    with open(cache_path) as f:
+        assert f.read() == "week,cases\n1,5\n"
+    entry = read_manifest(manifest_for(cache_path))[ARTIFACT["name"]]
+    assert entry["source"] == "http"
+    assert entry["md5Checksum"] == hashlib.md5(b"week,cases\n1,5\n").hexdigest()
+    assert not [n for n in os.listdir(os.path.dirname(cache_path)) if n.endswith(".part")]
+
+
+def test_unchanged_recheck_skips_the_download(mirror, cache_path):
+    root, source = mirror
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n")
+    assert download(source, ARTIFACT, cache_path)
+    version = dataset_version(ARTIFACT["name"], cache_path)
+
+    assert not download(source, ARTIFACT, cache_path)
+    assert len(gets()) == 1
+    assert dataset_version(ARTIFACT["name"], cache_path) == version
+
+
+def test_changed_source_is_swapped_in(mirror, cache_path):
+    root, source = mirror
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n")
+    assert download(source, ARTIFACT, cache_path)
+    version = dataset_version(ARTIFACT["name"], cache_path)
+
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n2,7\n")
+    assert download(source, ARTIFACT, cache_path)
+    with open(cache_path) as f:
+        assert f.read() == "week,cases\n1,5\n2,7\n"
+    assert dataset_version(ARTIFACT["name"], cache_path) != version
+
+
+def test_failed_verification_keeps_the_local_copy(mirror, cache_path):
+    root, source = mirror
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n")
+    assert download(source, ARTIFACT, cache_path)
+
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n2,7\n")
+    MirrorHandler.etag_override = "0" * 32
+    with pytest.raises(IOError, match="MD5 mismatch"):
+        download(source, ARTIFACT, cache_path)
+    with open(cache_path) as f:
+        assert f.read() == "week,cases\n1,5\n"
+    assert not [n for n in os.listdir(os.path.dirname(cache_path)) if n.endswith(".part")]
+
+
+def test_missing_artifact(mirror, cache_path):
+    _, source = mirror
+    assert source.metadata(ARTIFACT) is None
+    with pytest.raises(FileNotFoundError):
+        download(source, ARTIFACT, cache_path)
+
+
+def test_missing_artifact_is_not_reprobed_on_every_call(mirror, cache_path, monkeypatch):
+    root, source = mirror
+    for _ in range(3):
+        with pytest.raises(FileNotFoundError):
+            ensure_file(source, ARTIFACT, cache_path)
+    assert len(MirrorHandler.requests) == 1
+
+    # Published later: picked up once the negative answer has expired
+    (root / ARTIFACT["name"]).write_text("week,cases\n1,5\n")
+    monkeypatch.setattr(fetcher, "REFRESH_INTERVAL", 0)
+    assert ensure_file(source, ARTIFACT, cache_path) == cache_path
+    assert os.path.exists(cache_path)
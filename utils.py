@@ -1,57 +1,168 @@
-
-
-import pandas as pd
-import json
 import os
-import tempfile
 import re
+import shutil
+import urllib.error
+import urllib.parse
+import urllib.request
+import numpy as np
+import pandas as pd
+import threading
+from datetime import datetime, timedelta, timezone
+import httplib2
 from pydrive2.auth import GoogleAuth
 from pydrive2.drive import GoogleDrive
+from googleapiclient.http import MediaIoBaseDownload
 from oauth2client.service_account import ServiceAccountCredentials
+from fetcher import md5sum
+
+DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive"]
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# --- Process-wide Drive clients, one per service account ---
+_drives = {}
+_drives_lock = threading.Lock()
+
+# Refresh the access token ahead of expiry so no request races the deadline
+def _refresh_if_expiring(credentials):
+    expiry = credentials.token_expiry
+    if credentials.access_token is None or expiry is None or expiry - datetime.utcnow() < TOKEN_REFRESH_MARGIN:
+        credentials.refresh(httplib2.Http())
 
-# --- Load Google Drive credentials and file ---
+# --- Load Google Drive credentials (in memory, no temp files) ---
 def load_drive(gdrive_secrets):
     creds_dict = dict(gdrive_secrets)  # Convert to real dict
-    with tempfile.NamedTemporaryFile(mode='w+', delete=False) as tmp:
-        json.dump(creds_dict, tmp)
-        tmp.flush()
-        gauth = GoogleAuth()
-        gauth.credentials = ServiceAccountCredentials.from_json_keyfile_name(
-            tmp.name,
-            scopes=["https://www.googleapis.com/auth/drive"]
-        )
-        drive = GoogleDrive(gauth)
+    key = (creds_dict.get("client_email"), creds_dict.get("private_key_id"))
+    with _drives_lock:
+        drive = _drives.get(key)
+        if drive is None:
+            gauth = GoogleAuth()
+            gauth.credentials = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scopes=DRIVE_SCOPES)
+            _refresh_if_expiring(gauth.credentials)
+            gauth.Authorize()  # build the API service once, under the lock
+            drive = GoogleDrive(gauth)
+            _drives[key] = drive
+        _refresh_if_expiring(drive.auth.credentials)
     return drive
 
-# --- Sort district names ---
-def get_sorted_districts(df):
-    individual_districts = [d for d in df['dtname_disp'].unique() if d.lower() != 'all']
-
-    def sort_key(name):
-        # High Districts
-        match_high = re.search(r'\(High District - (\d+)\)', name)
-        if match_high:
-            return (0, int(match_high.group(1)))
-
-        # Districts with High Blocks
-        elif "(Has High Blocks)" in name:
-            return (1, name.lower())
-
-        # Other districts
-        else:
-            return (2, name.lower())
-
-    sorted_districts = sorted(individual_districts, key=sort_key)
-    return ['All'] + sorted_districts
-
-# --- Sort subdistrict names ---
-def get_sorted_subdistricts(df):
-    individual_subdistricts = [sd for sd in df['sdtname_disp'].unique() if sd.lower() != 'all']
-    def sort_key(name):
-        match = re.search(r'\(High Block - (\d+)\)', name)
-        if match:
-            return (0, int(match.group(1)))
-        else:
-            return (1, name.lower())
-    sorted_subdistricts = sorted(individual_subdistricts, key=sort_key)
-    return ['All'] + sorted_subdistricts
+# --- Data sources ---
+# Every backend answers two questions about an artifact ({"name": local file
+# name, "file_id": Drive ID or None}): metadata() -> {"md5Checksum", "fileSize",
+# "modifiedDate"} or None when the source does not have it, and fetch(), which
+# writes the content to a temp path. The fetcher does the rest (shared cache
+# directory, manifest, verification, atomic swap) the same way for all of them.
+DRIVE_METADATA_FIELDS = "md5Checksum,fileSize,modifiedDate"
+DRIVE_CHUNK_SIZE = 1 << 24  # bytes per download request
+HTTP_TIMEOUT = 60  # seconds per mirror request
+MD5_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+class DriveSource:
+    label = "drive"
+
+    def __init__(self, credentials):
+        self.credentials = credentials  # callable returning the service-account secrets
+
+    # The Drive client is shared by every fetch thread, but httplib2.Http is not
+    # thread-safe: each job authorizes its own http object in metadata() and
+    # fetch() reuses it, with the requests built on the shared API service.
+    def metadata(self, artifact):
+        if not artifact.get("file_id"):
+            return None
+        auth = load_drive(self.credentials()).auth
+        http = auth.Get_Http_Object()
+        request = auth.service.files().get(fileId=artifact["file_id"], fields=DRIVE_METADATA_FIELDS,
+                                           supportsAllDrives=True)
+        remote = request.execute(http=http)
+        return {"md5Checksum": remote.get("md5Checksum"), "fileSize": remote.get("fileSize"),
+                "modifiedDate": remote.get("modifiedDate"), "auth": auth, "http": http}
+
+    def fetch(self, artifact, remote, dest):
+        request = remote["auth"].service.files().get_media(fileId=artifact["file_id"], supportsAllDrives=True)
+        request.http = remote["http"]
+        with open(dest, "wb") as f:
+            downloader = MediaIoBaseDownload(f, request, chunksize=DRIVE_CHUNK_SIZE)
+            done = False
+            while not done:
+                _, done = downloader.next_chunk()
+
+# A directory of dataset files (a checkout, a mounted share, synthetic data).
+# Checksums are cached per (mtime, size) so periodic checks only stat the file.
+class LocalSource:
+    label = "local"
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._md5 = {}
+
+    def metadata(self, artifact):
+        path = os.path.join(self.directory, artifact["name"])
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        if key not in self._md5:
+            self._md5[key] = md5sum(path)
+        modified = datetime.fromtimestamp(stat.st_mtime, timezone.utc).isoformat()
+        return {"md5Checksum": self._md5[key], "fileSize": str(stat.st_size), "modifiedDate": modified}
+
+    def fetch(self, artifact, remote, dest):
+        shutil.copyfile(os.path.join(self.directory, artifact["name"]), dest)
+
+# An HTTP mirror or S3-compatible bucket endpoint serving <base_url>/<name>.
+# S3 ETags of single-part uploads are the MD5; otherwise the size is verified
+# and (Last-Modified, size) identifies the version.
+class HttpSource:
+    label = "http"
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/") + "/"
+
+    def url(self, artifact):
+        return self.base_url + urllib.parse.quote(artifact["name"])
+
+    def metadata(self, artifact):
+        request = urllib.request.Request(self.url(artifact), method="HEAD")
+        try:
+            with urllib.request.urlopen(request, timeout=HTTP_TIMEOUT) as response:
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code in (403, 404):
+                return None
+            raise
+        etag = (headers.get("ETag") or "").strip('"').lower()
+        return {
+            "md5Checksum": etag if MD5_PATTERN.fullmatch(etag) else None,
+            "fileSize": headers.get("Content-Length"),
+            "modifiedDate": headers.get("Last-Modified"),
+        }
+
+    def fetch(self, artifact, remote, dest):
+        with urllib.request.urlopen(self.url(artifact), timeout=HTTP_TIMEOUT) as response, open(dest, "wb") as f:
+            shutil.copyfileobj(response, f, 1 << 20)
+
+# --- Name sort keys (vectorized: one str.extract over the unique names) ---
+HIGH_DISTRICT_PATTERN = r'\(High District - (\d+)\)'
+HIGH_BLOCK_PATTERN = r'\(High Block - (\d+)\)'
+
+def district_sort_keys(names):
+    names = pd.Series(names, dtype=str).reset_index(drop=True)
+    rank = pd.to_numeric(names.str.extract(HIGH_DISTRICT_PATTERN, expand=False)).astype("Int64")
+    # High Districts, then districts with High Blocks, then other districts
+    tier = np.where(rank.notna(), 0, np.where(names.str.contains("(Has High Blocks)", regex=False), 1, 2))
+    return pd.DataFrame({"name": names, "tier": tier, "rank": rank, "lower": names.str.lower()})
+
+def subdistrict_sort_keys(names):
+    names = pd.Series(names, dtype=str).reset_index(drop=True)
+    rank = pd.to_numeric(names.str.extract(HIGH_BLOCK_PATTERN, expand=False)).astype("Int64")
+    tier = np.where(rank.notna(), 0, 1)
+    return pd.DataFrame({"name": names, "tier": tier, "rank": rank, "lower": names.str.lower()})
+
+def sorted_names(keys):
+    keys = keys[keys["lower"] != 'all']
+    return keys.sort_values(["tier", "rank", "lower"])["name"].tolist()
+
+# --- Date x values as epoch milliseconds ---
+# Float64 arrays serialize as base64 binary in the figure JSON (int64 and
+# Timestamps do not); a date-typed axis still renders them as dates.
+def epoch_ms(dates):
+    return np.asarray(dates, dtype="datetime64[ms]").astype(np.int64).astype(np.float64)
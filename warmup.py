@@ -0,0 +1,201 @@
+"""Startup warm-up: fetch every dataset artifact and fill the shared caches.
+
+start_warmup() runs in a background thread. It first pulls all artifacts into
+the cache directory in parallel, then builds the weekly, monthly and boundary
+caches concurrently on a thread pool, so the first real page view only does
+cache lookups. home.py and every page call it; it is a no-op while a warm-up
+runs or after one succeeded. A failed warm-up is retried with exponential
+backoff (RETRY_DELAY doubling up to RETRY_MAX_DELAY), so a transient fetch
+error does not leave the node unready. Set VBD_NO_WARMUP=1 to turn it off
+(the benchmark does, to time cold caches).
+
+Streamlit has no server-start hook, so to warm a node before any session
+arrives, launch it through this module, which starts the warm-up and then
+runs the Streamlit server in the same process (same caches):
+
+    python warmup.py --server.port 8501
+
+Readiness: warmup_status() / is_ready() in-process, and, when VBD_READY_PORT
+is set, an HTTP endpoint for load balancers: GET /ready answers 200 once warm
+and 503 before that (or after a failed warm-up), with the status as JSON.
+"""
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+READY_PORT_ENV = "VBD_READY_PORT"
+NO_WARMUP_ENV = "VBD_NO_WARMUP"
+WARMUP_WORKERS = 3  # one per cache chain below
+RETRY_DELAY = 30  # seconds before the first retry of a failed warm-up
+RETRY_MAX_DELAY = 600
+
+_lock = threading.Lock()
+_status = {"state": "idle", "started": None, "finished": None, "steps": {}, "errors": {},
+           "failures": 0, "retry_at": None}
+_ready_server = None
+
+
+def _step(name, fn):
+    start = time.perf_counter()
+    result = fn()
+    _status["steps"][name] = round(time.perf_counter() - start, 3)
+    return result
+
+
+# --- Cache chains (each runs on its own worker) ---
+# Slider values come back as floats, and the cache key hashes 35 and 35.0
+# differently, so the default thresholds are warmed as floats.
+def _warm_weekly():
+    import data_store
+    import analysis
+    import lod
+    import ranking
+    import geometry
+
+    version = _step("weekly_version", data_store.weekly_data_version)
+    df = _step("weekly_data", lambda: data_store.load_weekly_data(version))
+    _step("weekly_index", lambda: data_store.load_weekly_index(version))
+    _step("weekly_options", lambda: data_store.load_weekly_options(version))
+    _step("trigger_rows", lambda: analysis.load_trigger_rows(version))
+
+    thresholds = {k: float(v) for k, v in analysis.DEFAULT_THRESHOLDS.items()}
+    for name in analysis.LAG_VARIABLES:
+        bounds = analysis.mask_bounds(name, thresholds)
+        _step(f"lags_{name}", lambda: analysis.load_lags(version, name, bounds))
+    for name in list(analysis.MASK_SPECS) + list(analysis.COMBINED_MASKS):
+        bounds = analysis.mask_bounds(name, thresholds)
+        _step(f"intervals_{name}", lambda: analysis.load_intervals(version, name, bounds))
+    all_bounds = analysis.mask_bounds("all", thresholds)
+    _step("breeding_table", lambda: analysis.load_breeding_table(version, all_bounds))
+    _step("map_arrays", lambda: geometry.load_map_arrays(version, all_bounds))
+
+    weeks = df["week_start_date"]
+    level = lod.choose_level(weeks.min(), weeks.max())
+    _step(f"lod_{level}", lambda: lod.load_level(version, level))
+    default_ranking = {"weeks": ranking.RANK_WINDOWS["Whole season"], "by": "percentile",
+                       "percentile": ranking.DEFAULT_PERCENTILE}
+    _step("top_ranked", lambda: ranking.top_ranked(version, "blocks", default_ranking))
+
+
+def _warm_monthly():
+    import data_store
+
+    version = _step("monthly_version", data_store.monthly_data_version)
+    _step("monthly_data", lambda: data_store.load_monthly_data(version))
+    _step("monthly_cube", lambda: data_store.load_monthly_cube(version))
+    _step("monthly_options", lambda: data_store.load_monthly_options(version))
+
+
+def _warm_boundaries():
+    import geometry
+
+    # District views are cut per district on first use; warm the statewide one
+    _step("geojson_state", lambda: geometry.block_geojson("state"))
+
+
+CHAINS = {"weekly": _warm_weekly, "monthly": _warm_monthly, "boundaries": _warm_boundaries}
+
+
+def _run():
+    import data_store
+
+    errors = {}
+    try:
+        fetch_errors = _step("fetch_all", data_store.fetch_all_artifacts)
+        # Optional artifacts (boundaries, GIF) may be absent; the map page handles it
+        errors.update({f"fetch_{k}": repr(e) for k, e in fetch_errors.items()
+                       if e is not None and not data_store.ARTIFACTS[k].get("optional")})
+        with ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup") as pool:
+            jobs = {name: pool.submit(chain) for name, chain in CHAINS.items()}
+        errors.update({name: repr(job.exception()) for name, job in jobs.items() if job.exception() is not None})
+    except Exception as e:
+        errors["warmup"] = repr(e)
+
+    with _lock:
+        _status["errors"] = errors
+        _status["finished"] = time.time()
+        _status["state"] = "failed" if errors else "ready"
+        _status["failures"] = _status["failures"] + 1 if errors else 0
+        delay = min(RETRY_DELAY * 2 ** (_status["failures"] - 1), RETRY_MAX_DELAY) if errors else None
+        _status["retry_at"] = _status["finished"] + delay if errors else None
+    if errors:
+        logger.warning("Warm-up failed (retrying in %ds): %s", delay, errors)
+        retry = threading.Timer(delay, start_warmup)
+        retry.daemon = True
+        retry.start()
+    else:
+        logger.info("Warm-up finished in %.1fs", _status["finished"] - _status["started"])
+
+
+# --- Public entry points ---
+def start_warmup():
+    if os.environ.get(NO_WARMUP_ENV) == "1":
+        return False
+    with _lock:
+        if _status["state"] in ("warming", "ready"):
+            return False
+        if _status["state"] == "failed" and time.time() < _status["retry_at"]:
+            return False
+        _status["state"] = "warming"
+        _status["started"] = time.time()
+    start_ready_server()
+    threading.Thread(target=_run, name="warmup", daemon=True).start()
+    return True
+
+
+def warmup_status():
+    with _lock:
+        return dict(_status, steps=dict(_status["steps"]), errors=dict(_status["errors"]))
+
+
+def is_ready():
+    return _status["state"] == "ready"
+
+
+# --- Readiness endpoint for load balancers (opt-in via VBD_READY_PORT) ---
+class _ReadyHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/ready", "/status"):
+            self.send_error(404)
+            return
+        body = json.dumps(warmup_status()).encode()
+        self.send_response(200 if self.path == "/status" or is_ready() else 503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_ready_server():
+    global _ready_server
+    port = os.environ.get(READY_PORT_ENV)
+    if not port or _ready_server is not None:
+        return _ready_server
+    _ready_server = ThreadingHTTPServer(("", int(port)), _ReadyHandler)
+    threading.Thread(target=_ready_server.serve_forever, name="ready-server", daemon=True).start()
+    return _ready_server
+
+
+# --- Launcher: warm up, then run the Streamlit server in this process ---
+def main():
+    from streamlit.web import cli
+    import warmup  # the module the pages import, not __main__, so they share its state
+
+    warmup.start_warmup()
+    home = os.path.join(os.path.dirname(os.path.abspath(__file__)), "home.py")
+    sys.argv = ["streamlit", "run", home] + sys.argv[1:]
+    sys.exit(cli.main())
+
+
+if __name__ == "__main__":
+    main()